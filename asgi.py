@@ -0,0 +1,167 @@
+import asyncio
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from speedreadApp import app as flask_app
+
+# Request bodies up to this size stay in memory while they arrive
+SPOOL_BYTES = 1024 * 1024
+
+
+class WsgiAdapter:
+    # Serves a WSGI app from an ASGI server. Connections and request bodies
+    # are handled on the event loop, so a slow client costs a socket and a
+    # spool file rather than a worker; the app itself only runs on the
+    # executor's threads once the whole body has arrived. Streamed responses
+    # are pulled from the app one chunk at a time, and the app's iterator is
+    # closed as soon as the client goes away.
+
+    def __init__(self, wsgi_app, executor, max_body=None):
+        self.wsgi_app = wsgi_app
+        self.executor = executor
+        self.max_body = max_body
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        body = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+        try:
+            size = await self._read_body(scope, receive, body)
+            if size is None:
+                return
+            body.seek(0)
+            environ = self._environ(scope, body, size)
+            await self._respond(environ, receive, send)
+        finally:
+            body.close()
+
+    async def _read_body(self, scope, receive, body):
+        # Returns the number of bytes read, or None if the client left. A body
+        # over the limit is not read further; the app sees its length and
+        # answers 413 itself.
+        declared = _header(scope, b'content-length')
+        if self.max_body is not None and declared is not None and declared.isdigit() \
+                and int(declared) > self.max_body:
+            return int(declared)
+
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            chunk = message.get('body', b'')
+            if chunk:
+                size += len(chunk)
+                if self.max_body is not None and size > self.max_body:
+                    return size
+                body.write(chunk)
+            if not message.get('more_body', False):
+                return size
+
+    def _environ(self, scope, body, size):
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+            'REMOTE_ADDR': client[0],
+            'REMOTE_PORT': str(client[1]),
+            'CONTENT_LENGTH': str(size),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.input_terminated': True,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope['headers']:
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name in ('CONTENT_LENGTH', 'TRANSFER_ENCODING'):
+                # The body handed to the app is complete and of known length
+                continue
+            if name != 'CONTENT_TYPE':
+                name = 'HTTP_' + name
+            # Repeated headers are joined the way a WSGI server would
+            environ[name] = environ[name] + ',' + value if name in environ else value
+        return environ
+
+    async def _respond(self, environ, receive, send):
+        loop = asyncio.get_running_loop()
+        started = []
+
+        def start_response(status, headers, exc_info=None):
+            started[:] = [status, headers]
+
+        def call_app():
+            # Flask calls start_response before returning, so the status and
+            # headers are known once this has run
+            chunks = self.wsgi_app(environ, start_response)
+            return chunks, iter(chunks)
+
+        chunks, iterator = await loop.run_in_executor(self.executor, call_app)
+        disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+        try:
+            status, headers = started
+            await send({
+                'type': 'http.response.start',
+                'status': int(status.split(' ', 1)[0]),
+                'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+            })
+            while not disconnected.done():
+                chunk = await loop.run_in_executor(self.executor, next, iterator, None)
+                if chunk is None:
+                    break
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            if not disconnected.done():
+                await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnected.cancel()
+            if hasattr(chunks, 'close'):
+                await loop.run_in_executor(self.executor, chunks.close)
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+def _header(scope, name):
+    for key, value in scope['headers']:
+        if key == name:
+            return value.decode('latin-1')
+    return None
+
+
+# Threads running the app, extraction included, per process:
+#   uvicorn asgi:app --workers 4
+app = WsgiAdapter(
+    flask_app,
+    ThreadPoolExecutor(max_workers=int(os.environ.get('SPEEDREAD_ASGI_THREADS', 16)),
+                       thread_name_prefix='speedread-asgi'),
+    max_body=flask_app.config['MAX_CONTENT_LENGTH'],
+)
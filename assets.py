@@ -0,0 +1,65 @@
+import mimetypes
+import os
+import re
+
+from compression import Precompressed
+
+
+JS_TYPES = ('text/javascript', 'application/javascript')
+
+
+class StaticAssets:
+    # Files from the static folder under content-hashed names, such as
+    # speedread_logo.3f2a1b9c0d.png, so browsers can cache them for good and
+    # a changed file gets a new URL. Files are read, minified and compressed
+    # once, when the app starts.
+
+    def __init__(self, folder, url_prefix='/assets/'):
+        self.url_prefix = url_prefix
+        self._hashed_names = {}
+        self._assets = {}
+        for root, _, files in os.walk(folder):
+            for filename in sorted(files):
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, folder).replace(os.sep, '/')
+                with open(path, 'rb') as f:
+                    data = f.read()
+                mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+                asset = Precompressed(minify(data, mimetype), mimetype)
+                stem, ext = os.path.splitext(name)
+                hashed_name = '%s.%s%s' % (stem, asset.digest[:10], ext)
+                self._hashed_names[name] = hashed_name
+                self._assets[hashed_name] = asset
+
+    def url(self, name):
+        return self.url_prefix + self._hashed_names[name]
+
+    def get(self, hashed_name):
+        return self._assets.get(hashed_name)
+
+
+def minify(data, mimetype):
+    if mimetype == 'text/css':
+        return _minify_css(data.decode('utf-8')).encode('utf-8')
+    if mimetype in JS_TYPES:
+        return _minify_js(data.decode('utf-8')).encode('utf-8')
+    return data
+
+
+def _minify_css(text):
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r' ?([{};,]) ?', r'\1', text)
+    return text.replace(';}', '}').strip()
+
+
+def _minify_js(text):
+    # Deliberately conservative: drops indentation, blank lines and
+    # whole-line comments, but keeps every line break so automatic semicolon
+    # insertion sees the same code. gzip does the rest.
+    lines = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not line.startswith('//'):
+            lines.append(line)
+    return '\n'.join(lines) + '\n'
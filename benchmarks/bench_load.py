@@ -0,0 +1,274 @@
+"""Load test the sync (gunicorn) and async (uvicorn + asgi.py) servers.
+
+Slow clients trickle upload bodies and idle clients hold open sockets while
+a fixed number of ordinary clients upload a PDF in a loop; the ordinary
+clients' latency and throughput show whether the slow ones starve them.
+
+    python -m benchmarks.bench_load --workers 2 --slow 200 --idle 2000
+    python -m benchmarks.bench_load --server asgi --duration 30
+    python -m benchmarks.bench_load --url http://127.0.0.1:8000
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+from benchmarks.bench_pipeline import RESULTS_DIR, summarize
+from benchmarks.synthetic import make_pdf
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BOUNDARY = 'speedread-load-test'
+
+SERVERS = {
+    'sync': lambda port, workers: [
+        sys.executable, '-m', 'gunicorn', 'speedreadApp:app', '--workers', str(workers),
+        '--bind', '127.0.0.1:%d' % port, '--log-level', 'warning'],
+    'asgi': lambda port, workers: [
+        sys.executable, '-m', 'uvicorn', 'asgi:app', '--workers', str(workers),
+        '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning', '--no-access-log'],
+}
+
+
+def multipart(pdf_bytes):
+    head = ('--%s\r\nContent-Disposition: form-data; name="pdf"; filename="load.pdf"\r\n'
+            'Content-Type: application/pdf\r\n\r\n' % BOUNDARY).encode('ascii')
+    return head + pdf_bytes + ('\r\n--%s--\r\n' % BOUNDARY).encode('ascii')
+
+
+def upload_head(host, body_length):
+    return ('POST /upload?format=compact HTTP/1.1\r\nHost: %s\r\nConnection: close\r\n'
+            'Content-Type: multipart/form-data; boundary=%s\r\nContent-Length: %d\r\n\r\n'
+            % (host, BOUNDARY, body_length)).encode('ascii')
+
+
+async def upload(host, port, body, timeout):
+    # One request on a fresh connection; returns the HTTP status
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        writer.write(upload_head(host, len(body)) + body)
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    return int(response.split(b' ', 2)[1]) if response.startswith(b'HTTP/') else 0
+
+
+async def ordinary_client(host, port, body, deadline, timeout, results):
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            status = await upload(host, port, body, timeout)
+        except asyncio.TimeoutError:
+            results['timeouts'] += 1
+            continue
+        except OSError:
+            results['errors'] += 1
+            await asyncio.sleep(0.05)
+            continue
+        if status == 200:
+            results['latencies'].append(time.perf_counter() - start)
+        else:
+            results['errors'] += 1
+
+
+async def slow_client(host, port, body, deadline, trickle_bytes, interval, state):
+    # Sends the headers, then a few bytes of the body at a time, like a
+    # phone on a poor connection; the body is never finished in the test
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        state['refused'] += 1
+        return
+    state['open'] += 1
+    try:
+        writer.write(upload_head(host, len(body)))
+        offset = 0
+        while time.monotonic() < deadline and offset < len(body) - trickle_bytes:
+            writer.write(body[offset:offset + trickle_bytes])
+            await writer.drain()
+            offset += trickle_bytes
+            await asyncio.sleep(interval)
+        state['held'] += 1
+    except OSError:
+        state['dropped'] += 1
+    finally:
+        writer.close()
+
+
+async def idle_client(host, port, deadline, state):
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        state['refused'] += 1
+        return
+    state['open'] += 1
+    try:
+        # A server that closes the socket makes read() return early
+        remaining = deadline - time.monotonic()
+        data = await asyncio.wait_for(reader.read(1), max(0.0, remaining))
+        state['dropped' if data == b'' else 'held'] += 1
+    except asyncio.TimeoutError:
+        state['held'] += 1
+    except OSError:
+        state['dropped'] += 1
+    finally:
+        writer.close()
+
+
+async def run_load(host, port, args, pdf_bytes):
+    body = multipart(pdf_bytes)
+    # One upload first so ordinary requests measure the server, not extraction
+    await upload(host, port, body, 60)
+
+    deadline = time.monotonic() + args.duration
+    results = {'latencies': [], 'timeouts': 0, 'errors': 0}
+    slow = {'open': 0, 'held': 0, 'dropped': 0, 'refused': 0}
+    idle = {'open': 0, 'held': 0, 'dropped': 0, 'refused': 0}
+    tasks = [idle_client(host, port, deadline, idle) for _ in range(args.idle)]
+    tasks += [slow_client(host, port, body, deadline, args.trickle_bytes, args.trickle_interval, slow)
+              for _ in range(args.slow)]
+    background = [asyncio.ensure_future(task) for task in tasks]
+    # Let the slow and idle clients connect before measuring
+    await asyncio.sleep(min(2.0, args.duration / 4))
+
+    start = time.monotonic()
+    await asyncio.gather(*[
+        ordinary_client(host, port, body, deadline, args.timeout, results) for _ in range(args.concurrency)])
+    elapsed = time.monotonic() - start
+    await asyncio.gather(*background)
+
+    latencies = results['latencies']
+    summary = {
+        'requests': len(latencies),
+        'requests_per_second': len(latencies) / elapsed if elapsed else 0.0,
+        'timeouts': results['timeouts'],
+        'errors': results['errors'],
+        'slow_clients': slow,
+        'idle_clients': idle,
+    }
+    if latencies:
+        summary['latency'] = summarize(latencies)
+        ordered = sorted(latencies)
+        summary['latency']['p99'] = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+        summary['latency']['max'] = ordered[-1]
+    return summary
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('server exited with status %d' % process.returncode)
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('server did not start on port %d' % port)
+
+
+def run_server(name, args, pdf_bytes):
+    port = free_port()
+    # A private cache and session store so earlier runs don't decide the result
+    scratch = tempfile.mkdtemp(prefix='speedread-load-')
+    env = dict(os.environ)
+    env['SPEEDREAD_CACHE_DIR'] = os.path.join(scratch, 'cache')
+    env['SPEEDREAD_SESSION_DB'] = os.path.join(scratch, 'sessions.sqlite3')
+    process = subprocess.Popen(SERVERS[name](port, args.workers), cwd=ROOT, env=env)
+    try:
+        wait_for_port(port, process)
+        return asyncio.run(run_load('127.0.0.1', port, args, pdf_bytes))
+    finally:
+        process.terminate()
+        process.wait(10)
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def raise_file_limit(connections):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = connections + 256
+    if soft < wanted:
+        limit = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (limit, hard))
+        if limit < wanted:
+            print('warning: only %d file descriptors available' % limit)
+
+
+def report(name, summary):
+    latency = summary.get('latency')
+    if latency:
+        timing = 'p50 %7.1fms  p95 %7.1fms  p99 %7.1fms  max %7.1fms' % (
+            latency['median'] * 1000, latency['p95'] * 1000, latency['p99'] * 1000, latency['max'] * 1000)
+    else:
+        timing = 'no request completed'
+    print('%-5s %7.1f req/s  %s  timeouts %d  errors %d' % (
+        name, summary['requests_per_second'], timing, summary['timeouts'], summary['errors']))
+    for kind in ('slow_clients', 'idle_clients'):
+        state = summary[kind]
+        print('      %-12s open %d  held %d  dropped %d  refused %d' % (
+            kind, state['open'], state['held'], state['dropped'], state['refused']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--server', choices=sorted(SERVERS) + ['both'], default='both')
+    parser.add_argument('--url', help='test a server that is already running instead')
+    parser.add_argument('--workers', type=int, default=2, help='server processes')
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--concurrency', type=int, default=8, help='ordinary clients')
+    parser.add_argument('--slow', type=int, default=50, help='clients trickling an upload')
+    parser.add_argument('--idle', type=int, default=500, help='connections that send nothing')
+    parser.add_argument('--trickle-bytes', type=int, default=512)
+    parser.add_argument('--trickle-interval', type=float, default=0.5)
+    parser.add_argument('--timeout', type=float, default=10.0, help='per ordinary request')
+    parser.add_argument('--pages', type=int, default=5)
+    parser.add_argument('--output', help='where to write the JSON results')
+    args = parser.parse_args(argv)
+
+    raise_file_limit(args.idle + args.slow + args.concurrency)
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    pdf_bytes = make_pdf(args.pages, 300, 0)
+
+    runs = {}
+    if args.url:
+        url = urlsplit(args.url)
+        runs['url'] = asyncio.run(run_load(url.hostname, url.port or 80, args, pdf_bytes))
+    else:
+        for name in sorted(SERVERS) if args.server == 'both' else [args.server]:
+            runs[name] = run_server(name, args, pdf_bytes)
+
+    results = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'params': {key: value for key, value in vars(args).items() if key != 'output'},
+        'runs': runs,
+    }
+    print()
+    for name, summary in runs.items():
+        report(name, summary)
+
+    output = args.output
+    if output is None:
+        output = os.path.join(RESULTS_DIR, 'load-%s.json' % time.strftime('%Y%m%d-%H%M%S'))
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print('\nwrote', output)
+
+
+if __name__ == '__main__':
+    main()
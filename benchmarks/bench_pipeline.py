@@ -0,0 +1,195 @@
+"""Time each stage of the upload pipeline on synthetic PDFs.
+
+    python -m benchmarks.bench_pipeline --pages 300 --words-per-page 400
+    python -m benchmarks.bench_pipeline --compare benchmarks/results/<earlier>.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from array import array
+
+import extraction
+import extractors
+import speedreadApp
+import tokenizer
+from benchmarks.synthetic import make_pdf
+from extraction_cache import ExtractionCache
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+
+def measure(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return summarize(timings)
+
+
+def summarize(timings):
+    ordered = sorted(timings)
+    return {
+        'min': ordered[0],
+        'median': statistics.median(ordered),
+        'p95': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        'mean': statistics.fmean(ordered),
+        'total': sum(ordered),
+        'samples': len(ordered),
+    }
+
+
+def pdf_library():
+    module = sys.modules[extraction.PdfReader.__module__.split('.')[0]]
+    return '%s %s' % (module.__name__, getattr(module, '__version__', '?'))
+
+
+def bench_stages(pdf_bytes, repeat):
+    stages = {}
+    stages['reader'] = measure(lambda: extraction.open_reader(pdf_bytes), repeat)
+
+    # Raw library cost, one sample per page
+    reader = extraction.open_reader(pdf_bytes)
+    texts = []
+    page_timings = []
+    for page in reader.pages:
+        start = time.perf_counter()
+        texts.append(page.extract_text() or '')
+        page_timings.append(time.perf_counter() - start)
+    stages['extract_text_per_page'] = summarize(page_timings)
+
+    # extract_text plus the visitor that records word positions
+    stages['extract_with_positions'] = measure(
+        lambda: [extraction._tokenize_page(page) for page in reader.pages], 1)
+
+    stages['tokenize'] = measure(lambda: [tokenizer.tokenize(text) for text in texts], repeat)
+
+    page_words = [tokenizer.tokenize(text)[0] for text in texts]
+
+    def annotate():
+        document = extraction.DocumentBuilder()
+        offset = 0
+        for words, text in zip(page_words, texts):
+            document.add_page(words, offset, array('f', extraction.NO_BOX * len(words)))
+            offset += len(text) + 1
+        return document.result()
+    stages['annotate'] = measure(annotate, repeat)
+
+    result = annotate()
+    digest = '0' * 64
+    with speedreadApp.app.test_request_context('/upload'):
+        full = speedreadApp.upload_payload(result, digest)
+    with speedreadApp.app.test_request_context('/upload?format=compact'):
+        compact = speedreadApp.upload_payload(result, digest)
+    for name, payload in (('json_default', full), ('json_compact', compact)):
+        stages[name] = measure(lambda: json.dumps(payload, separators=(',', ':')), repeat)
+        stages[name]['bytes'] = len(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+
+    return stages, sum(len(words) for words in page_words)
+
+
+def bench_memory(pdf_bytes):
+    tracemalloc.start()
+    extractors.extract_document(pdf_bytes, 'bench.pdf', 'application/pdf')
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def bench_requests(pdf_bytes, requests, cached):
+    original = speedreadApp.extraction_cache
+    # A zero budget with no spill directory never hits
+    speedreadApp.extraction_cache = ExtractionCache(max_bytes=256 * 1024 * 1024 if cached else 0)
+    client = speedreadApp.app.test_client()
+    try:
+        if cached:
+            client.post('/upload', data={'pdf': (io.BytesIO(pdf_bytes), 'bench.pdf')})
+        start = time.perf_counter()
+        for _ in range(requests):
+            response = client.post('/upload?format=compact', data={'pdf': (io.BytesIO(pdf_bytes), 'bench.pdf')})
+            assert response.status_code == 200, response.get_data(as_text=True)
+        elapsed = time.perf_counter() - start
+    finally:
+        speedreadApp.extraction_cache = original
+    return {'requests': requests, 'seconds': elapsed, 'requests_per_second': requests / elapsed}
+
+
+def compare(previous, current):
+    print('\n%-26s %12s %12s %8s' % ('stage (median)', 'previous', 'current', 'ratio'))
+    for name, stage in current['stages'].items():
+        before = previous.get('stages', {}).get(name)
+        if not before:
+            continue
+        print('%-26s %10.2fms %10.2fms %7.2fx' % (
+            name, before['median'] * 1000, stage['median'] * 1000, stage['median'] / before['median']))
+    for name in ('uncached', 'cached'):
+        before = previous.get('requests', {}).get(name)
+        after = current['requests'].get(name)
+        if before and after:
+            print('%-26s %10.1f/s %10.1f/s %7.2fx' % (
+                'requests ' + name, before['requests_per_second'], after['requests_per_second'],
+                after['requests_per_second'] / before['requests_per_second']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=100)
+    parser.add_argument('--words-per-page', type=int, default=350)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--requests', type=int, default=5)
+    parser.add_argument('--output', help='where to write the JSON results')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    args = parser.parse_args(argv)
+
+    pdf_bytes = make_pdf(args.pages, args.words_per_page, args.seed)
+    stages, total_words = bench_stages(pdf_bytes, args.repeat)
+
+    results = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'pdf_library': pdf_library(),
+        'params': {
+            'pages': args.pages,
+            'words_per_page': args.words_per_page,
+            'seed': args.seed,
+            'pdf_bytes': len(pdf_bytes),
+            'words': total_words,
+            'extract_workers': extraction.EXTRACT_WORKERS,
+        },
+        'stages': stages,
+        'peak_memory_bytes': bench_memory(pdf_bytes),
+        'requests': {
+            'uncached': bench_requests(pdf_bytes, args.requests, cached=False),
+            'cached': bench_requests(pdf_bytes, args.requests, cached=True),
+        },
+    }
+
+    for name, stage in stages.items():
+        extra = ' (%d bytes)' % stage['bytes'] if 'bytes' in stage else ''
+        print('%-26s median %9.2fms  total %9.2fms%s' % (name, stage['median'] * 1000, stage['total'] * 1000, extra))
+    print('%-26s %.1f MiB' % ('peak memory', results['peak_memory_bytes'] / 2 ** 20))
+    for name, run in results['requests'].items():
+        print('%-26s %.1f/s' % ('requests ' + name, run['requests_per_second']))
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, 'pipeline-%s.json' % time.strftime('%Y%m%d-%H%M%S'))
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print('\nwrote', output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""Tokenizer throughput and cleanup on a large synthetic corpus.
+
+    python -m benchmarks.bench_tokenize --pages 2000 --words-per-page 400
+    python -m benchmarks.bench_tokenize --pdf book.pdf
+
+Synthetic pages carry a running header, a page number footer, words
+hyphenated across line breaks and ligature glyphs, so the word counts show
+what the plain whitespace split kept that the tokenizer removes.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import time
+
+import extraction
+import tokenizer
+from benchmarks.bench_pipeline import RESULTS_DIR, measure
+from benchmarks.synthetic import make_text
+
+LIGATURES = (('ffi', '\ufb03'), ('ffl', '\ufb04'), ('ff', '\ufb00'), ('fi', '\ufb01'), ('fl', '\ufb02'))
+WHITESPACE = re.compile(r'\S+')
+
+
+def make_corpus(pages, words_per_page, seed):
+    # Page texts the way extract_text() returns them, and the words a reader
+    # should actually see
+    rng = random.Random(seed)
+    texts = []
+    truth = []
+    for number, lines in enumerate(make_text(words_per_page, pages, seed), start=1):
+        out = ['Journal of Applied Reading Research   Vol. 12   %d' % number]
+        for line in lines:
+            truth.extend(line.split())
+        for i, line in enumerate(lines):
+            words = line.split()
+            words = [_ligature(word) if rng.random() < 0.3 else word for word in words]
+            line = ' '.join(words)
+            # Break the line's last word across the line break now and then
+            last = words[-1]
+            if i + 1 < len(lines) and len(last) > 6 and last.isalpha() and rng.random() < 0.5:
+                cut = rng.randint(3, len(last) - 3)
+                line = line[:-len(last)] + last[:cut] + '-'
+                lines[i + 1] = last[cut:] + ' ' + lines[i + 1]
+            out.append(line)
+        out.append('- %d -' % number)
+        texts.append('\n'.join(out) + '\n')
+    return texts, truth
+
+
+def _ligature(word):
+    for plain, glyph in LIGATURES:
+        word = word.replace(plain, glyph)
+    return word
+
+
+def pdf_corpus(path):
+    with open(path, 'rb') as f:
+        reader = extraction.open_reader(f.read())
+    return [page.extract_text() or '' for page in reader.pages], None
+
+
+def tokenize_document(texts):
+    running_lines = tokenizer.RunningLines()
+    words = []
+    for index, text in enumerate(texts):
+        page_words, _, edges = tokenizer.tokenize(text)
+        dropped = running_lines.drop(index, edges)
+        if dropped:
+            page_words, _ = tokenizer.drop_words(page_words, None, dropped)
+        words.extend(page_words)
+    return words
+
+
+def split_document(texts):
+    words = []
+    for text in texts:
+        words.extend(WHITESPACE.findall(text))
+    return words
+
+
+def accuracy(words, truth):
+    # Multiset overlap with the expected words over the longer of the two;
+    # it ignores order, but an alignment would cost more than the tokenizing
+    expected = {}
+    for word in truth:
+        expected[word] = expected.get(word, 0) + 1
+    matched = 0
+    for word in words:
+        if expected.get(word):
+            expected[word] -= 1
+            matched += 1
+    return matched / max(len(words), len(truth))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=2000)
+    parser.add_argument('--words-per-page', type=int, default=400)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--pdf', help='tokenize the text of this PDF instead of the synthetic corpus')
+    parser.add_argument('--output', help='where to write the JSON results')
+    args = parser.parse_args(argv)
+
+    if args.pdf:
+        texts, truth = pdf_corpus(args.pdf)
+    else:
+        texts, truth = make_corpus(args.pages, args.words_per_page, args.seed)
+    chars = sum(len(text) for text in texts)
+
+    runs = {}
+    for name, fn in (('whitespace_split', split_document), ('tokenizer', tokenize_document)):
+        timing = measure(lambda: fn(texts), args.repeat)
+        words = fn(texts)
+        runs[name] = {
+            'timing': timing,
+            'words': len(words),
+            'chars_per_second': chars / timing['median'],
+            'words_per_second': len(words) / timing['median'],
+        }
+        if truth is not None:
+            runs[name]['accuracy'] = accuracy(words, truth)
+
+    results = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'params': {
+            'pages': len(texts),
+            'chars': chars,
+            'source': args.pdf or 'synthetic',
+            'words_per_page': None if args.pdf else args.words_per_page,
+            'seed': args.seed,
+            'expected_words': len(truth) if truth is not None else None,
+        },
+        'runs': runs,
+    }
+
+    print('%d pages, %.1f MB of text%s' % (
+        len(texts), chars / 1e6, '' if truth is None else ', %d words expected' % len(truth)))
+    for name, run in runs.items():
+        extra = '' if 'accuracy' not in run else '  accuracy %.2f%%' % (run['accuracy'] * 100)
+        print('%-18s median %8.1fms  %6.1f MB/s  %5.2fM words/s  %8d words%s' % (
+            name, run['timing']['median'] * 1000, run['chars_per_second'] / 1e6,
+            run['words_per_second'] / 1e6, run['words'], extra))
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, 'tokenize-%s.json' % time.strftime('%Y%m%d-%H%M%S'))
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print('\nwrote', output)
+
+
+if __name__ == '__main__':
+    main()
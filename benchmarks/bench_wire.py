@@ -0,0 +1,118 @@
+"""Compare the JSON and binary word payloads: size, encode and decode time.
+
+    python -m benchmarks.bench_wire --words 150000
+
+Browser-side decode is measured under Node when it is installed.
+"""
+import argparse
+import gzip
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+
+import extraction
+import wordpack
+from benchmarks.bench_pipeline import RESULTS_DIR, measure
+from benchmarks.synthetic import make_text
+from reading import dwell_times, orp_offsets
+
+WORDS_PER_PAGE = 400
+
+
+def make_words(total, seed):
+    pages = max(1, -(-total // WORDS_PER_PAGE))
+    words = []
+    for lines in make_text(WORDS_PER_PAGE, pages, seed):
+        for line in lines:
+            words.extend(line.split())
+    return words[:total]
+
+
+def node_decode(json_bytes, pack, repeat):
+    node = shutil.which('node')
+    if node is None:
+        return None
+    script = os.path.join(os.path.dirname(__file__), 'wire_decode.js')
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, 'payload.json')
+        pack_path = os.path.join(tmp, 'payload.bin')
+        with open(json_path, 'wb') as f:
+            f.write(json_bytes)
+        with open(pack_path, 'wb') as f:
+            f.write(pack)
+        output = subprocess.run([node, script, json_path, pack_path, str(repeat)],
+                                check=True, capture_output=True, text=True).stdout
+    return json.loads(output)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--words', type=int, default=150000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--output', help='where to write the JSON results')
+    args = parser.parse_args(argv)
+
+    words = make_words(args.words, args.seed)
+    dwell = dwell_times(words)
+    orp = orp_offsets(words)
+    sentence_breaks = extraction.find_sentence_breaks(words)
+    meta = {'sha256': '0' * 64}
+
+    # Same content as format=compact&annotate=1
+    def encode_json():
+        payload = {'words': words, 'sentenceBreaks': sentence_breaks, 'dwell': dwell, 'orp': orp, **meta}
+        return json.dumps(payload, separators=(',', ':')).encode('utf-8')
+
+    def encode_pack():
+        return wordpack.encode_words(words, dwell, orp, sentence_breaks, None, meta)
+
+    json_bytes = encode_json()
+    pack = encode_pack()
+    formats = {
+        'json': {
+            'bytes': len(json_bytes),
+            'gzip_bytes': len(gzip.compress(json_bytes, 6)),
+            'encode': measure(encode_json, args.repeat),
+            'decode_python': measure(lambda: json.loads(json_bytes), args.repeat),
+        },
+        'binary': {
+            'bytes': len(pack),
+            'gzip_bytes': len(gzip.compress(pack, 6)),
+            'encode': measure(encode_pack, args.repeat),
+            'decode_python': measure(lambda: wordpack.decode_words(pack), args.repeat),
+        },
+    }
+    browser = node_decode(json_bytes, pack, args.repeat)
+    if browser is not None:
+        for name, timing in browser.items():
+            formats[name]['decode_js'] = timing
+
+    print('%-8s %12s %12s %12s %12s %12s' % ('format', 'bytes', 'gzip', 'encode', 'decode py', 'decode js'))
+    for name, stats in formats.items():
+        decode_js = '%10.2fms' % (stats['decode_js']['median'] * 1000) if 'decode_js' in stats else 'n/a'
+        print('%-8s %12d %12d %10.2fms %10.2fms %12s' % (
+            name, stats['bytes'], stats['gzip_bytes'], stats['encode']['median'] * 1000,
+            stats['decode_python']['median'] * 1000, decode_js))
+
+    results = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'params': {'words': len(words), 'seed': args.seed, 'repeat': args.repeat},
+        'formats': formats,
+    }
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, 'wire-%s.json' % time.strftime('%Y%m%d-%H%M%S'))
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print('\nwrote', output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+import random
+
+VOCABULARY = (
+    'the of and to in is that for it as was with be by on not he this are or his from at which but have '
+    'an they you were her she there been one all we their has would when if so no will more can said '
+    'reading information document chapter section analysis performance extraction measurement system '
+    'throughput latency memory processor interval sentence paragraph comprehension vocabulary velocity '
+    'understanding considerable international organization responsibility characteristic'
+).split()
+
+PAGE_WIDTH = 612
+PAGE_HEIGHT = 792
+FONT_SIZE = 11
+LEADING = 14
+MARGIN = 72
+# Characters per line at Helvetica 11pt inside one-inch margins
+LINE_CHARS = 90
+
+
+def make_text(words_per_page, pages, seed=0):
+    # Deterministic pseudo-prose: one list of lines per page
+    rng = random.Random(seed)
+    document = []
+    for _ in range(pages):
+        lines = []
+        line = []
+        length = 0
+        for i in range(words_per_page):
+            word = rng.choice(VOCABULARY)
+            if rng.random() < 0.07 or i == words_per_page - 1:
+                word += rng.choice('..,?!')
+            if length + len(word) > LINE_CHARS:
+                lines.append(' '.join(line))
+                line = []
+                length = 0
+            line.append(word)
+            length += len(word) + 1
+        if line:
+            lines.append(' '.join(line))
+        document.append(lines)
+    return document
+
+
+def make_pdf(pages=10, words_per_page=300, seed=0):
+    # A minimal uncompressed PDF with one Helvetica text object per page
+    objects = {
+        1: b'<< /Type /Catalog /Pages 2 0 R >>',
+        3: b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    }
+    kids = []
+    next_id = 4
+    for lines in make_text(words_per_page, pages, seed):
+        page_id, content_id = next_id, next_id + 1
+        next_id += 2
+        kids.append(page_id)
+
+        ops = [b'BT /F1 %d Tf %d TL %d %d Td' % (FONT_SIZE, LEADING, MARGIN, PAGE_HEIGHT - MARGIN)]
+        for line in lines:
+            escaped = line.encode('latin-1').replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+            ops.append(b'(' + escaped + b') Tj T*')
+        ops.append(b'ET')
+        stream = b'\n'.join(ops)
+
+        objects[page_id] = (
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] '
+            b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % (PAGE_WIDTH, PAGE_HEIGHT, content_id)
+        )
+        objects[content_id] = b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream'
+
+    objects[2] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+        b' '.join(b'%d 0 R' % kid for kid in kids), len(kids))
+
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = {}
+    for object_id in range(1, next_id):
+        offsets[object_id] = len(out)
+        out += b'%d 0 obj\n' % object_id + objects[object_id] + b'\nendobj\n'
+
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % next_id
+    for object_id in range(1, next_id):
+        out += b'%010d 00000 n \n' % offsets[object_id]
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (next_id, xref)
+    return bytes(out)
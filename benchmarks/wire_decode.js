@@ -0,0 +1,33 @@
+// Browser-side decode cost of the two word payloads, run under Node by
+// bench_wire.py: node wire_decode.js <payload.json> <payload.bin> <repeat>
+const fs = require('fs');
+const path = require('path');
+const {decodeWordPack} = require(path.join(__dirname, '..', 'static', 'wordpack.js'));
+
+function median(values) {
+    const sorted = values.slice().sort((a, b) => a - b);
+    return sorted[Math.floor(sorted.length / 2)];
+}
+
+function time(fn, repeat) {
+    const samples = [];
+    for (let i = 0; i < repeat; i++) {
+        const start = process.hrtime.bigint();
+        fn();
+        samples.push(Number(process.hrtime.bigint() - start) / 1e9);
+    }
+    return {median: median(samples), min: Math.min(...samples), samples: repeat};
+}
+
+const [jsonPath, packPath, repeatArg] = process.argv.slice(2);
+const repeat = parseInt(repeatArg || '10');
+const jsonBytes = fs.readFileSync(jsonPath);
+const packBytes = fs.readFileSync(packPath);
+const packBuffer = packBytes.buffer.slice(packBytes.byteOffset, packBytes.byteOffset + packBytes.length);
+const decoder = new TextDecoder();
+
+// response.json() is a UTF-8 decode followed by JSON.parse
+console.log(JSON.stringify({
+    json: time(() => JSON.parse(decoder.decode(jsonBytes)), repeat),
+    binary: time(() => decodeWordPack(packBuffer), repeat),
+}));
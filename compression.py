@@ -0,0 +1,68 @@
+import gzip
+import hashlib
+
+try:
+    import brotli
+except ImportError:
+    # Optional; gzip alone is still served
+    brotli = None
+
+# Responses smaller than this aren't worth compressing
+MIN_SIZE = 1024
+# Text-like types only; PNG and other image formats are compressed already
+COMPRESSIBLE_TYPES = (
+    'text/html', 'text/css', 'text/plain', 'text/javascript', 'application/javascript',
+    'application/json', 'application/vnd.speedread.words', 'image/svg+xml',
+)
+
+# Lower levels for per-request compression, the maximum for bodies compressed once
+DYNAMIC_GZIP_LEVEL = 6
+DYNAMIC_BROTLI_QUALITY = 5
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def is_compressible(mimetype):
+    return mimetype in COMPRESSIBLE_TYPES
+
+
+def choose_encoding(accept_encodings, encodings):
+    # First of encodings the client accepts, in the server's order of preference
+    for encoding in encodings:
+        if accept_encodings.quality(encoding) > 0:
+            return encoding
+    return None
+
+
+def compress(data, encoding, static=False):
+    if encoding == 'br':
+        return brotli.compress(data, quality=11 if static else DYNAMIC_BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=9 if static else DYNAMIC_GZIP_LEVEL, mtime=0)
+
+
+class Precompressed:
+    # A fixed body with every encoded variant built once, and a strong ETag
+    # for each variant derived from the content hash
+
+    def __init__(self, data, mimetype):
+        self.mimetype = mimetype
+        self.digest = hashlib.sha256(data).hexdigest()
+        self.variants = {None: data}
+        if is_compressible(mimetype) and len(data) >= MIN_SIZE:
+            for encoding in available_encodings():
+                encoded = compress(data, encoding, static=True)
+                if len(encoded) < len(data):
+                    self.variants[encoding] = encoded
+
+    def etag(self, encoding):
+        return self.digest[:32] + ('-' + encoding if encoding else '')
+
+    def etags(self):
+        return [self.etag(encoding) for encoding in self.variants]
+
+    def select(self, accept_encodings):
+        encodings = [encoding for encoding in available_encodings() if encoding in self.variants]
+        encoding = choose_encoding(accept_encodings, encodings)
+        return encoding, self.variants[encoding]
@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import OrderedDict
+
+from extractors import extract_pages
+
+
+class DocumentClosed(Exception):
+    pass
+
+
+class OpenDocument:
+    # A parsed document and the upload it reads from. Readers are counted
+    # rather than locked out, so closing never waits for one: the entry is
+    # marked closed at once and the last reader to finish releases the upload.
+
+    def __init__(self, uploaded, source, expires_at):
+        self.uploaded = uploaded
+        self.source = source
+        self.expires_at = expires_at
+        self.closed = False
+        self.readers = 0
+        self._state_lock = threading.Lock()
+        # Parsers aren't thread-safe, so one page at a time per document
+        self.parse_lock = threading.Lock()
+
+    def extract(self, pages, timings=None):
+        # None if the entry was closed after it was looked up
+        if not self._acquire():
+            return None
+        try:
+            with self.parse_lock:
+                return extract_pages(self.source, pages, timings)
+        finally:
+            self._release()
+
+    def iter_pages(self, pages, timings=None):
+        # Like extract, a page at a time. The parse lock is only held while a
+        # page is extracted, never while the caller has a page, so a stalled
+        # stream doesn't hold up other readers or close().
+        if not self._acquire():
+            raise DocumentClosed('Document was closed, please retry')
+        iterator = self.source.iter_pages(timings, pages)
+        try:
+            while True:
+                with self.parse_lock:
+                    page = next(iterator, None)
+                if page is None:
+                    return
+                yield page
+        finally:
+            with self.parse_lock:
+                iterator.close()
+            self._release()
+
+    def close(self):
+        with self._state_lock:
+            self.closed = True
+            release = self.readers == 0
+        if release:
+            self.uploaded.close()
+
+    def _acquire(self):
+        with self._state_lock:
+            if self.closed:
+                return False
+            self.readers += 1
+            return True
+
+    def _release(self):
+        with self._state_lock:
+            self.readers -= 1
+            release = self.closed and self.readers == 0
+        if release:
+            self.uploaded.close()
+
+
+class DocumentCache:
+    # Parsed documents kept open for a short while, so further page ranges of
+    # a file skip the upload and the parse. Each entry holds its memory-mapped
+    # upload; entries are closed when they expire or are evicted. Per process,
+    # unlike the extraction cache.
+
+    def __init__(self, max_entries=16, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, digest):
+        self._expire()
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                self._entries.move_to_end(digest)
+                entry.expires_at = time.monotonic() + self.ttl
+            return entry
+
+    def put(self, digest, uploaded, source):
+        # Takes ownership of uploaded. If the document is already open the
+        # existing entry is returned and the new upload is closed.
+        entry = OpenDocument(uploaded, source, time.monotonic() + self.ttl)
+        with self._lock:
+            existing = self._entries.get(digest)
+            if existing is not None:
+                self._entries.move_to_end(digest)
+                closing = [entry]
+                entry = existing
+            else:
+                self._entries[digest] = entry
+                closing = []
+                while len(self._entries) > self.max_entries:
+                    closing.append(self._entries.popitem(last=False)[1])
+        for old in closing:
+            old.close()
+        return entry
+
+    def _expire(self):
+        now = time.monotonic()
+        with self._lock:
+            expired = [digest for digest, entry in self._entries.items() if entry.expires_at < now]
+            closing = [self._entries.pop(digest) for digest in expired]
+        for entry in closing:
+            entry.close()
@@ -0,0 +1,308 @@
+import base64
+import io
+import math
+import mmap
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from array import array
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    from pypdf import PdfReader
+except ImportError:
+    # Older deployments only have the legacy package name
+    from PyPDF2 import PdfReader
+
+from preflight import page_has_fonts
+from reading import SENTENCE_END, dwell_times, orp_offsets
+from textstats import TextStats
+from tokenizer import RunningLines, drop_words, tokenize
+
+# Bumped whenever the same bytes would extract to different words, so results
+# persisted by an earlier version are not served
+EXTRACTION_VERSION = 2
+
+# Number of extraction processes per server worker; 1 keeps everything in
+# the request worker. By default the cores are shared between the WEB_CONCURRENCY
+# server processes gunicorn and uvicorn start, rather than each taking all of them.
+SERVER_WORKERS = max(1, int(os.environ.get('WEB_CONCURRENCY', 1)))
+EXTRACT_WORKERS = int(os.environ.get(
+    'SPEEDREAD_EXTRACT_WORKERS', max(1, (os.cpu_count() or 1) // SERVER_WORKERS)))
+# Documents shorter than this are not worth the process hand-off
+PARALLEL_MIN_PAGES = int(os.environ.get('SPEEDREAD_PARALLEL_MIN_PAGES', 64))
+
+# Approximate glyph advance as a fraction of the font size; the visitor
+# callbacks don't report per-glyph widths
+AVG_CHAR_WIDTH = 0.5
+# Portion of the font size that sits below the baseline
+DESCENT = 0.2
+NO_BOX = (math.nan, math.nan, math.nan, math.nan)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Per-process reader over the memory-mapped upload, reused across page ranges
+_worker_reader = None
+_worker_token = None
+
+
+class DocumentBuilder:
+    # Collects per-page extraction output into the cached result layout
+
+    def __init__(self, outline=None):
+        self.outline = outline
+        self.words = []
+        self.page_offsets = []
+        self.char_offsets = []
+        self.sentence_breaks = []
+        self.boxes = array('f')
+        self.dwell = []
+        self.orp = []
+        self.stats = TextStats()
+
+    def add_page(self, page_words, char_offset, boxes):
+        self.page_offsets.append(len(self.words))
+        self.char_offsets.append(char_offset)
+        self.sentence_breaks.extend(find_sentence_breaks(page_words, len(self.words)))
+        self.stats.update(page_words)
+        self.boxes.extend(boxes)
+        self.dwell.extend(dwell_times(page_words))
+        self.orp.extend(orp_offsets(page_words))
+        self.words.extend(page_words)
+
+    def sentence_count(self):
+        return count_sentences(self.sentence_breaks, len(self.words))
+
+    def result(self):
+        result = {
+            'words': self.words,
+            'page_offsets': self.page_offsets,
+            'char_offsets': self.char_offsets,
+            'sentence_breaks': self.sentence_breaks,
+            'positions': encode_boxes(self.boxes),
+            'dwell': self.dwell,
+            'orp': self.orp,
+            'stats': self.stats.summary(self.sentence_count()),
+        }
+        if self.outline:
+            result['outline'] = self.outline
+        return result
+
+
+class TooManyPages(ValueError):
+    pass
+
+
+def open_reader(pdf_bytes, max_pages=None):
+    # pdf_bytes may be a memory map of the upload, which the reader can seek
+    # in directly; wrapping it in BytesIO would copy the whole file
+    stream = pdf_bytes if isinstance(pdf_bytes, mmap.mmap) else io.BytesIO(pdf_bytes)
+    pdf_reader = PdfReader(stream)
+    if max_pages is not None and len(pdf_reader.pages) > max_pages:
+        raise TooManyPages('Document has %d pages, the limit is %d' % (len(pdf_reader.pages), max_pages))
+    return pdf_reader
+
+
+def iter_page_words(pdf_reader, pdf_bytes=None, timings=None, pages=None):
+    # Yield (page number, words, char offset, boxes) in page order as pages are
+    # extracted. boxes holds an (x, y, width, height) quad per word in PDF
+    # user space. If given, timings accumulates seconds spent in the PDF
+    # library ('extract_text') and in our own word mapping ('tokenize').
+    # pages limits extraction to those 0-based page indices; char offsets
+    # then count only the text of the pages extracted.
+    indices = range(len(pdf_reader.pages)) if pages is None else pages
+    if pdf_bytes is not None and EXTRACT_WORKERS > 1 and len(indices) >= PARALLEL_MIN_PAGES:
+        extracted = _iter_parallel(pdf_bytes, indices)
+    else:
+        extracted = (_tokenize_page(pdf_reader.pages[i]) for i in indices)
+
+    # Headers and footers can only be told apart across pages, so they are
+    # dropped here, in page order, rather than in the workers
+    running_lines = RunningLines()
+    char_offset = 0
+    for index, (page_words, text_length, boxes, edges, extract_seconds, tokenize_seconds) in zip(indices, extracted):
+        dropped = running_lines.drop(index, edges)
+        if dropped:
+            page_words, boxes = drop_words(page_words, boxes, dropped)
+        if timings is not None:
+            timings['extract_text'] = timings.get('extract_text', 0.0) + extract_seconds
+            timings['tokenize'] = timings.get('tokenize', 0.0) + tokenize_seconds
+        yield index + 1, page_words, char_offset, boxes
+        char_offset += text_length + 1
+
+
+def find_sentence_breaks(words, offset=0):
+    # Indices of the words that end a sentence
+    return [offset + i for i, word in enumerate(words) if SENTENCE_END.search(word)]
+
+
+def count_sentences(sentence_breaks, total_words):
+    # Trailing words without a terminator still count as a sentence
+    if total_words == 0:
+        return 0
+    if not sentence_breaks or sentence_breaks[-1] != total_words - 1:
+        return len(sentence_breaks) + 1
+    return len(sentence_breaks)
+
+
+def iter_cached_pages(result, pages=None):
+    # Replay a cached extraction as (page number, words, char offset, boxes),
+    # optionally only the given sorted 0-based page indices. As with a fresh
+    # extraction of those pages, char offsets count only the pages replayed.
+    page_offsets = result['page_offsets']
+    char_offsets = result['char_offsets']
+    words = result['words']
+    char_offset = 0
+    boxes = decode_boxes(result['positions']) if 'positions' in result else None
+    for i in range(len(page_offsets)) if pages is None else pages:
+        start = page_offsets[i]
+        end = page_offsets[i + 1] if i + 1 < len(page_offsets) else len(words)
+        if boxes is not None:
+            page_boxes = boxes[start * 4:end * 4]
+        else:
+            page_boxes = array('f', NO_BOX * (end - start))
+        yield i + 1, words[start:end], char_offset, page_boxes
+        if i + 1 < len(char_offsets):
+            char_offset += char_offsets[i + 1] - char_offsets[i]
+
+
+def encode_boxes(boxes):
+    # Little-endian Float32 quads, readable directly as a Float32Array
+    if sys.byteorder == 'big':
+        boxes = array('f', boxes)
+        boxes.byteswap()
+    return base64.b64encode(boxes.tobytes()).decode('ascii')
+
+
+def decode_boxes(encoded):
+    boxes = array('f')
+    boxes.frombytes(base64.b64decode(encoded))
+    if sys.byteorder == 'big':
+        boxes.byteswap()
+    return boxes
+
+
+def _tokenize_page(page):
+    # Record where each text fragment starts so words can be mapped back to
+    # the text matrix in effect when they were drawn
+    if not page_has_fonts(page):
+        # Scanned or blank: no font, so no text to extract
+        return [], 0, array('f'), [], 0.0, 0.0
+
+    fragment_starts = []
+    fragment_origins = []
+    length = 0
+
+    def visit(text, cm, tm, font_dict, font_size):
+        nonlocal length
+        if not text:
+            return
+        # Text space to user space: tm x cm
+        a = tm[0] * cm[0] + tm[1] * cm[2]
+        b = tm[0] * cm[1] + tm[1] * cm[3]
+        c = tm[2] * cm[0] + tm[3] * cm[2]
+        d = tm[2] * cm[1] + tm[3] * cm[3]
+        x = tm[4] * cm[0] + tm[5] * cm[2] + cm[4]
+        y = tm[4] * cm[1] + tm[5] * cm[3] + cm[5]
+        size = font_size or 1
+        fragment_starts.append(length)
+        fragment_origins.append((x, y, size * math.hypot(a, b), size * math.hypot(c, d)))
+        length += len(text)
+
+    start_time = time.perf_counter()
+    text = page.extract_text(visitor_text=visit) or ''
+    extracted_time = time.perf_counter()
+
+    mapped = bool(fragment_starts) and length == len(text)
+    words, spans, edges = tokenize(text, offsets=mapped)
+    if not mapped:
+        boxes = array('f', NO_BOX * len(words))
+        return words, len(text), boxes, edges, extracted_time - start_time, time.perf_counter() - extracted_time
+
+    boxes = array('f')
+    for start, end in zip(spans[::2], spans[1::2]):
+        fragment = bisect_right(fragment_starts, start) - 1
+        if fragment < 0:
+            boxes.extend(NO_BOX)
+            continue
+        x, y, width_scale, height = fragment_origins[fragment]
+        newline = text.rfind('\n', fragment_starts[fragment], start)
+        line_start = newline + 1 if newline >= 0 else fragment_starts[fragment]
+        char_width = AVG_CHAR_WIDTH * width_scale
+        boxes.extend((
+            x + (start - line_start) * char_width,
+            y - DESCENT * height,
+            (end - start) * char_width,
+            height,
+        ))
+
+    return words, len(text), boxes, edges, extracted_time - start_time, time.perf_counter() - extracted_time
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # The pool is often first needed from a job, batch or ASGI thread;
+            # forking a process with other threads running can leave a lock held
+            # in the child, so workers come from a clean forkserver process
+            _executor = ProcessPoolExecutor(
+                max_workers=EXTRACT_WORKERS, mp_context=multiprocessing.get_context('forkserver'))
+        return _executor
+
+
+def _reset_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def _iter_parallel(pdf_bytes, indices):
+    # Workers map the same temp file instead of each receiving a pickled copy
+    fd, path = tempfile.mkstemp(suffix='.pdf')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(pdf_bytes)
+
+        # Identifies this upload even if the temp file name is later reused
+        token = uuid.uuid4().hex
+
+        # A few ranges per worker so one slow range doesn't leave cores idle
+        chunk_size = max(1, math.ceil(len(indices) / (EXTRACT_WORKERS * 4)))
+        executor = _get_executor()
+        futures = [
+            executor.submit(_extract_pages, path, token, indices[start:start + chunk_size])
+            for start in range(0, len(indices), chunk_size)
+        ]
+
+        try:
+            for future in futures:
+                yield from future.result()
+        except BrokenProcessPool:
+            _reset_executor()
+            raise
+        finally:
+            for future in futures:
+                future.cancel()
+    finally:
+        os.unlink(path)
+
+
+def _extract_pages(path, token, indices):
+    global _worker_reader, _worker_token
+    if _worker_token != token:
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        _worker_reader = PdfReader(mapped)
+        _worker_token = token
+
+    return [_tokenize_page(_worker_reader.pages[i]) for i in indices]
@@ -0,0 +1,211 @@
+import base64
+import gzip
+import json
+import os
+import sys
+import tempfile
+import threading
+from array import array
+from collections import OrderedDict
+
+from extraction import EXTRACTION_VERSION
+
+
+class ExtractionCache:
+    # Extraction results keyed by the SHA-256 of the uploaded bytes.
+    # Recently used entries stay in memory under a budget charged with their
+    # estimated heap size, alongside the packed word windows of documents
+    # being read, which are small enough to keep even for long books; every entry is
+    # also written to a directory that all workers on the host share, which
+    # is pruned to its own budget, least recently used files first.
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, spill_dir=None, max_disk_bytes=None):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def get(self, digest):
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                self._entries.move_to_end(digest)
+                return entry[0]
+
+        # Fall back to the shared on-disk store
+        payload = self._read_spill(digest)
+        if payload is None:
+            return None
+        result = json.loads(payload)
+        self._remember(digest, result, _footprint(result))
+        return result
+
+    def put(self, digest, result):
+        payload = json.dumps(result, separators=(',', ':')).encode('utf-8')
+        self._remember(digest, result, _footprint(result))
+        self._write_spill(digest, payload)
+
+    def windows(self, digest, load):
+        # WordWindows for the document; load(digest) returns the full result
+        # and is only called the first time, however large the document
+        key = digest + ':windows'
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry[0]
+        result = load(digest)
+        if result is None:
+            return None
+        windows = WordWindows(result)
+        self._remember(key, windows, windows.size)
+        return windows
+
+    def __contains__(self, digest):
+        with self._lock:
+            if digest in self._entries:
+                return True
+        path = self._spill_path(digest)
+        return path is not None and os.path.exists(path)
+
+    def _remember(self, digest, result, size):
+        # Anything larger than the whole budget only lives on disk
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(digest, None)
+            if old is not None:
+                self._size -= old[1]
+            self._entries[digest] = (result, size)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+
+    def _spill_path(self, digest):
+        if not self.spill_dir or not digest.isalnum():
+            return None
+        # Versioned, as the directory outlives the code that wrote it
+        return os.path.join(self.spill_dir, digest[:2], '%s-v%d.json.gz' % (digest, EXTRACTION_VERSION))
+
+    def _read_spill(self, digest):
+        path = self._spill_path(digest)
+        if path is None:
+            return None
+        try:
+            with gzip.open(path, 'rb') as f:
+                payload = f.read()
+        except (OSError, EOFError):
+            return None
+        self._touch(path)
+        return payload
+
+    def _touch(self, path):
+        # The mtime is the file's last use, which pruning goes by
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _write_spill(self, digest, payload):
+        path = self._spill_path(digest)
+        if path is None:
+            return
+        if os.path.exists(path):
+            self._touch(path)
+            return
+        directory = os.path.dirname(path)
+        tmp_path = None
+        try:
+            os.makedirs(directory, exist_ok=True)
+            # Write to a temp file first so other workers never see a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb') as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except OSError:
+            if tmp_path and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            return
+        self._prune_spill()
+
+    def _prune_spill(self):
+        if self.max_disk_bytes is None:
+            return
+        files = []
+        total = 0
+        for directory, _, names in os.walk(self.spill_dir):
+            for name in names:
+                if not name.endswith('.json.gz'):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    info = os.stat(path)
+                except OSError:
+                    # Pruned by another worker meanwhile
+                    continue
+                files.append((info.st_mtime, info.st_size, path))
+                total += info.st_size
+        if total <= self.max_disk_bytes:
+            return
+        files.sort()
+        for _, size, path in files:
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= self.max_disk_bytes:
+                break
+
+
+class WordWindows:
+    # A document's words, dwell times, ORP offsets and boxes packed into flat
+    # arrays, for serving /doc/<id>/words windows without the parsed result
+
+    def __init__(self, result):
+        words = result['words']
+        self.total = len(words)
+        self.text = ''.join(words)
+        self.offsets = array('I', [0])
+        position = 0
+        for word in words:
+            position += len(word)
+            self.offsets.append(position)
+        self.dwell = bytes(result['dwell'])
+        self.orp = array('H', result['orp'])
+        self.positions = base64.b64decode(result['positions']) if 'positions' in result else None
+        self.size = (sys.getsizeof(self.text) + sys.getsizeof(self.offsets) + sys.getsizeof(self.dwell)
+                     + sys.getsizeof(self.orp) + (sys.getsizeof(self.positions) if self.positions else 0))
+
+    def window(self, start, end):
+        # (words, dwell, orp, positions) for words start..end; positions is
+        # the raw Float32 quad buffer or None
+        text = self.text
+        offsets = self.offsets
+        words = [text[offsets[i]:offsets[i + 1]] for i in range(start, end)]
+        positions = self.positions[start * 16:end * 16] if self.positions is not None else None
+        return words, list(self.dwell[start:end]), self.orp[start:end].tolist(), positions
+
+
+def _footprint(value):
+    # Rough heap size of a parsed JSON value. Small ints are shared by the
+    # interpreter, so lists of them only cost their pointers.
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += sys.getsizeof(key) + _footprint(item)
+    elif isinstance(value, list) and value:
+        first = value[0]
+        if isinstance(first, int) and not isinstance(first, bool):
+            if min(value) < -5 or max(value) > 256:
+                size += sum(map(sys.getsizeof, value))
+        elif isinstance(first, (str, float)):
+            size += sum(map(sys.getsizeof, value))
+        else:
+            size += sum(map(_footprint, value))
+    return size
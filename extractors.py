@@ -0,0 +1,486 @@
+import codecs
+import io
+import posixpath
+import re
+import time
+import zipfile
+from array import array
+from html.parser import HTMLParser
+from urllib.parse import unquote
+from xml.etree import ElementTree
+
+import ocr
+import preflight
+from extraction import NO_BOX, DocumentBuilder, TooManyPages, iter_cached_pages, iter_page_words, open_reader
+from tokenizer import RunningLines, drop_words, tokenize
+
+
+class UnsupportedFormat(ValueError):
+    pass
+
+
+class NoTextLayer(ValueError):
+    pass
+
+
+class PageRangeError(ValueError):
+    pass
+
+
+# Archive members larger than this once inflated are refused (zip bombs)
+MAX_MEMBER_BYTES = 64 * 1024 * 1024
+# Plain text has no pages; it is cut at paragraph breaks into pages of about this size
+TEXT_PAGE_CHARS = 3000
+# Bookmarks beyond this many are left out of the outline
+MAX_OUTLINE_ENTRIES = 1000
+# Signatures of binary containers, which are never read as text
+BINARY_MAGIC = (b'PK\x03\x04', b'%PDF')
+
+CONTAINER_NS = '{urn:oasis:names:tc:opendocument:xmlns:container}'
+OPF_NS = '{http://www.idpf.org/2007/opf}'
+DOCX_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+_extractors = []
+
+
+def register(extractor):
+    # Later registrations are tried first, so a plugin can override a built-in
+    _extractors.insert(0, extractor)
+    return extractor
+
+
+def find_extractor(data, filename=None, mimetype=None):
+    # Magic bytes decide; the file name and declared type only break ties
+    # for formats without a signature, such as plain text
+    for extractor in _extractors:
+        if extractor.sniff(data):
+            return extractor
+    head = bytes(data[:1024])
+    binary = head.startswith(BINARY_MAGIC)
+    extension = posixpath.splitext((filename or '').lower())[1]
+    for extractor in _extractors:
+        if extractor.text and binary:
+            continue
+        if extension in extractor.extensions or mimetype in extractor.mimetypes:
+            return extractor
+    # Anything else is read as plain text if it is UTF-8
+    if head and not binary and b'\0' not in head and is_utf8(head):
+        return plain_text
+    raise UnsupportedFormat('Unsupported file type')
+
+
+def is_utf8(head):
+    # head may end part way through a character
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(head)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def open_document(data, filename=None, mimetype=None, max_pages=None):
+    document = find_extractor(data, filename, mimetype).open(data)
+    if max_pages is not None and document.pages_total > max_pages:
+        raise TooManyPages('Document has %d pages, the limit is %d' % (document.pages_total, max_pages))
+    return document
+
+
+def extract_document(data, filename=None, mimetype=None, timings=None, max_pages=None):
+    start_time = time.perf_counter()
+    source = open_document(data, filename, mimetype, max_pages)
+    if timings is not None:
+        timings['parse'] = time.perf_counter() - start_time
+    return extract_pages(source, timings=timings)
+
+
+def extract_pages(source, pages=None, timings=None):
+    # pages is a list of 0-based page indices, None for the whole document.
+    # A partial result says which pages it holds and how many there are; its
+    # char offsets start at 0 on the first page it holds.
+    document = DocumentBuilder(source.outline())
+    for page_num, page_words, char_offset, boxes in source.iter_pages(timings, pages):
+        document.add_page(page_words, char_offset, boxes)
+    result = document.result()
+    if pages is not None:
+        result['page_numbers'] = [i + 1 for i in pages]
+        result['pages_total'] = source.pages_total
+    return result
+
+
+def parse_page_ranges(spec, pages_total):
+    # "1-3,7,10-" as sorted 0-based page indices. Pages are numbered from 1;
+    # an open end runs to the last page and ends past it are clamped.
+    if not isinstance(spec, str):
+        raise PageRangeError('Invalid page range %r' % (spec,))
+    pages = set()
+    for part in spec.split(','):
+        part = part.strip()
+        match = re.fullmatch(r'(\d*)\s*-\s*(\d*)|(\d+)', part)
+        if match is None or part == '-':
+            raise PageRangeError('Invalid page range %r' % part)
+        if match.group(3):
+            first = last = int(match.group(3))
+        else:
+            first = int(match.group(1) or 1)
+            last = min(int(match.group(2) or pages_total), pages_total)
+        if first > last and first <= pages_total:
+            raise PageRangeError('Invalid page range %r' % part)
+        if first < 1 or first > pages_total:
+            raise PageRangeError('Page range %r is outside 1-%d' % (part, pages_total))
+        pages.update(range(first - 1, last))
+    return sorted(pages)
+
+
+class Extractor:
+    # One input format. sniff() looks at the leading bytes; open() returns a
+    # document with pages_total, outline() and iter_pages(timings, pages),
+    # which yields (page number, words, char offset, boxes) like
+    # iter_page_words. text marks formats that are read as decoded text.
+    name = None
+    mimetypes = ()
+    extensions = ()
+    text = False
+
+    def sniff(self, data):
+        return False
+
+    def open(self, data):
+        raise NotImplementedError
+
+
+class PdfDocument:
+    format = 'pdf'
+
+    def __init__(self, data):
+        self.data = data
+        self.reader = open_reader(data)
+        self.pages_total = len(self.reader.pages)
+
+    def iter_pages(self, timings=None, pages=None):
+        return iter_page_words(self.reader, self.data, timings, pages)
+
+    def outline(self):
+        # Bookmarks as a flat list of {title, page, level}, pages from 1
+        entries = []
+        try:
+            self._walk_outline(self.reader.outline, 0, entries)
+        except Exception:
+            # Broken outlines are common and never worth failing an upload for
+            pass
+        return entries
+
+    def _walk_outline(self, items, level, entries):
+        # A nested list holds the children of the bookmark before it
+        for item in items:
+            if len(entries) >= MAX_OUTLINE_ENTRIES:
+                return
+            if isinstance(item, list):
+                self._walk_outline(item, level + 1, entries)
+                continue
+            page = self.reader.get_destination_page_number(item)
+            if page is not None and 0 <= page < self.pages_total:
+                entries.append({'title': str(item.title or '').strip(), 'page': page + 1, 'level': level})
+
+
+class TextDocument:
+    # Pages (or chapters) of plain text without word positions. A section
+    # may be a callable so a long EPUB is parsed one chapter at a time.
+    # running_lines drops page headers and footers, for text of page images.
+
+    def __init__(self, format, sections, running_lines=False):
+        self.format = format
+        self.sections = sections
+        self.pages_total = len(sections)
+        self.running_lines = running_lines
+
+    def iter_pages(self, timings=None, pages=None):
+        running_lines = RunningLines() if self.running_lines else None
+        char_offset = 0
+        for i in range(self.pages_total) if pages is None else pages:
+            section = self.sections[i]
+            start_time = time.perf_counter()
+            text = section() if callable(section) else section
+            extracted_time = time.perf_counter()
+            words, _, edges = tokenize(text)
+            if running_lines is not None:
+                words, _ = drop_words(words, None, running_lines.drop(i, edges))
+            boxes = array('f', NO_BOX * len(words))
+            if timings is not None:
+                timings['extract_text'] = timings.get('extract_text', 0.0) + extracted_time - start_time
+                timings['tokenize'] = timings.get('tokenize', 0.0) + time.perf_counter() - extracted_time
+            yield i + 1, words, char_offset, boxes
+            char_offset += len(text) + 1
+
+    def outline(self):
+        return []
+
+
+class CachedDocument:
+    # A finished extraction behind the same interface, so page ranges of a
+    # cached document are sliced from it rather than parsed again
+    format = None
+
+    def __init__(self, result):
+        self.result = result
+        self.pages_total = len(result['page_offsets'])
+
+    def iter_pages(self, timings=None, pages=None):
+        return iter_cached_pages(self.result, pages)
+
+    def outline(self):
+        return self.result.get('outline', [])
+
+
+class PdfExtractor(Extractor):
+    name = 'pdf'
+    mimetypes = ('application/pdf',)
+    extensions = ('.pdf',)
+
+    def sniff(self, data):
+        # Readers accept the header anywhere in the first kilobyte
+        return b'%PDF-' in data[:1024]
+
+    def open(self, data):
+        document = PdfDocument(data)
+        # Catch scans before spending extract_text on every page
+        report = preflight.analyze(document.reader)
+        if report.has_text:
+            return document
+        if ocr.available():
+            return TextDocument('pdf-ocr', [lambda page=page: ocr.page_text(page) for page in document.reader.pages],
+                                running_lines=True)
+        if report.image_only:
+            raise NoTextLayer('No text found: this PDF appears to be scanned images')
+        raise NoTextLayer('No text found in this PDF')
+
+
+class TextExtractor(Extractor):
+    name = 'txt'
+    mimetypes = ('text/plain',)
+    extensions = ('.txt', '.text', '.md')
+    text = True
+
+    def open(self, data):
+        return TextDocument(self.name, paginate(decode_text(data)))
+
+
+class HtmlExtractor(Extractor):
+    name = 'html'
+    mimetypes = ('text/html', 'application/xhtml+xml')
+    extensions = ('.html', '.htm', '.xhtml')
+    text = True
+
+    def sniff(self, data):
+        head = bytes(data[:512]).lstrip(b'\xef\xbb\xbf \t\r\n').lower()
+        return head.startswith((b'<!doctype html', b'<html'))
+
+    def open(self, data):
+        return TextDocument(self.name, html_sections(decode_text(data)))
+
+
+class EpubExtractor(Extractor):
+    name = 'epub'
+    mimetypes = ('application/epub+zip',)
+    extensions = ('.epub',)
+
+    def sniff(self, data):
+        # The OCF spec requires an uncompressed "mimetype" first entry
+        return data[:4] == b'PK\x03\x04' and data[30:58] == b'mimetypeapplication/epub+zip'
+
+    def open(self, data):
+        archive = open_archive(data)
+        opf_path = self._package_path(archive)
+        package = ElementTree.fromstring(read_member(archive, opf_path))
+        base = posixpath.dirname(opf_path)
+
+        manifest = {}
+        for item in package.iter(OPF_NS + 'item'):
+            manifest[item.get('id')] = posixpath.normpath(posixpath.join(base, unquote(item.get('href', ''))))
+
+        # One section per chapter in reading order, parsed when reached
+        sections = []
+        for itemref in package.iter(OPF_NS + 'itemref'):
+            path = manifest.get(itemref.get('idref'))
+            if path is None or itemref.get('linear') == 'no':
+                continue
+            sections.append(lambda path=path: ' '.join(html_sections(decode_text(read_member(archive, path)))))
+        return TextDocument(self.name, sections)
+
+    def _package_path(self, archive):
+        container = ElementTree.fromstring(read_member(archive, 'META-INF/container.xml'))
+        rootfile = container.find('.//%srootfile' % CONTAINER_NS)
+        if rootfile is None:
+            raise ValueError('EPUB has no package document')
+        return rootfile.get('full-path')
+
+
+class DocxExtractor(Extractor):
+    name = 'docx'
+    mimetypes = ('application/vnd.openxmlformats-officedocument.wordprocessingml.document',)
+    extensions = ('.docx',)
+
+    def sniff(self, data):
+        if data[:4] != b'PK\x03\x04':
+            return False
+        try:
+            return 'word/document.xml' in open_archive(data).namelist()
+        except zipfile.BadZipFile:
+            return False
+
+    def open(self, data):
+        archive = open_archive(data)
+        check_member(archive, 'word/document.xml')
+
+        # Page breaks as Word last laid the document out, plus explicit ones
+        pages = []
+        text = []
+        with archive.open('word/document.xml') as f:
+            for event, element in ElementTree.iterparse(f, events=('start', 'end')):
+                tag = element.tag
+                if event == 'start':
+                    if tag == DOCX_NS + 'lastRenderedPageBreak' or (
+                            tag == DOCX_NS + 'br' and element.get(DOCX_NS + 'type') == 'page'):
+                        if ''.join(text).strip():
+                            pages.append(''.join(text))
+                            text = []
+                    continue
+                if tag == DOCX_NS + 't':
+                    text.append(element.text or '')
+                elif tag in (DOCX_NS + 'tab', DOCX_NS + 'br'):
+                    text.append(' ')
+                elif tag == DOCX_NS + 'p':
+                    text.append('\n')
+                    # Paragraphs are done with; drop them to keep memory flat
+                    element.clear()
+        if ''.join(text).strip() or not pages:
+            pages.append(''.join(text))
+        return TextDocument(self.name, pages)
+
+
+def open_archive(data):
+    return zipfile.ZipFile(_BufferFile(data))
+
+
+class _BufferFile(io.RawIOBase):
+    # Seekable file over bytes or a memory map; BytesIO would copy the upload
+
+    def __init__(self, data):
+        self.data = data
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += len(self.data)
+        self.position = max(0, offset)
+        return self.position
+
+    def readinto(self, buffer):
+        chunk = self.data[self.position:self.position + len(buffer)]
+        buffer[:len(chunk)] = chunk
+        self.position += len(chunk)
+        return len(chunk)
+
+
+def check_member(archive, name):
+    try:
+        info = archive.getinfo(name)
+    except KeyError:
+        raise ValueError('Archive is missing %s' % name)
+    if info.file_size > MAX_MEMBER_BYTES:
+        raise ValueError('%s is too large to extract' % name)
+    return info
+
+
+def read_member(archive, name):
+    return archive.read(check_member(archive, name))
+
+
+def decode_text(data):
+    try:
+        return str(data, 'utf-8-sig')
+    except UnicodeDecodeError:
+        # Most non-UTF-8 text in the wild is Windows-1252
+        return str(data, 'cp1252', 'replace')
+
+
+def paginate(text):
+    # Form feeds are explicit page breaks; otherwise pages end at the first
+    # blank line after TEXT_PAGE_CHARS
+    pages = []
+    for part in text.split('\f'):
+        page = []
+        length = 0
+        for paragraph in re.split(r'\n\s*\n', part):
+            page.append(paragraph)
+            length += len(paragraph) + 2
+            if length >= TEXT_PAGE_CHARS:
+                pages.append('\n\n'.join(page))
+                page = []
+                length = 0
+        if page:
+            pages.append('\n\n'.join(page))
+    return pages or ['']
+
+
+class _HtmlText(HTMLParser):
+    # Visible text, with a new section at each top-level heading
+    SKIP = {'script', 'style', 'head', 'title', 'template', 'noscript'}
+    BLOCK = {'p', 'div', 'br', 'li', 'tr', 'section', 'article', 'blockquote', 'pre',
+             'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'dt', 'dd', 'figcaption', 'hr'}
+    SECTION = {'h1', 'h2'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.sections = []
+        self.text = []
+        self.skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self.skipping += 1
+        elif tag in self.SECTION and ''.join(self.text).strip():
+            self.sections.append(''.join(self.text))
+            self.text = []
+        if tag in self.BLOCK:
+            self.text.append('\n')
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP and self.skipping:
+            self.skipping -= 1
+        elif tag in self.BLOCK:
+            self.text.append('\n')
+
+    def handle_data(self, data):
+        if not self.skipping:
+            self.text.append(data)
+
+    def close(self):
+        super().close()
+        if ''.join(self.text).strip() or not self.sections:
+            self.sections.append(''.join(self.text))
+        return self.sections
+
+
+def html_sections(markup):
+    parser = _HtmlText()
+    parser.feed(markup)
+    return parser.close()
+
+
+# Text has no signature; it matches by extension or as the last resort
+plain_text = register(TextExtractor())
+register(HtmlExtractor())
+register(DocxExtractor())
+register(EpubExtractor())
+register(PdfExtractor())
@@ -0,0 +1,137 @@
+import queue
+import threading
+import time
+import uuid
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobTimeout(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, digest, timeout):
+        self.id = uuid.uuid4().hex
+        self.digest = digest
+        self.status = 'queued'
+        self.pages_done = 0
+        self.pages_total = None
+        self.error = None
+        self.deadline = time.monotonic() + timeout
+        self.finished_at = None
+
+    def progress(self, pages_done):
+        # Called by the job between pages; a thread can't be killed, so this
+        # is where an overrunning job stops itself
+        self.pages_done = pages_done
+        if time.monotonic() > self.deadline:
+            raise JobTimeout('Timed out')
+
+    def to_dict(self):
+        info = {
+            'id': self.id,
+            'status': self.status,
+            'pages_done': self.pages_done,
+            'pages_total': self.pages_total,
+            'sha256': self.digest,
+        }
+        if self.error is not None:
+            info['error'] = self.error
+        return info
+
+
+class JobQueue:
+    # Bounded in-process queue drained by a fixed set of worker threads.
+    # run(job, payload) does the work and stores its output somewhere keyed
+    # by job.digest, so finished jobs hold no results of their own;
+    # discard(payload) releases a payload that run never got to see.
+
+    def __init__(self, run, discard=None, workers=2, max_pending=16, timeout=120, ttl=600):
+        self.run = run
+        self.discard = discard
+        self.workers = workers
+        self.timeout = timeout
+        self.ttl = ttl
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def submit(self, digest, payload):
+        self._start()
+        self._expire()
+
+        job = Job(digest, self.timeout)
+        with self._lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait((job, payload))
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.id]
+            raise QueueFull('Too many pending jobs')
+        return job
+
+    def complete(self, digest):
+        # Register an already finished job, e.g. for a cache hit
+        self._expire()
+        job = Job(digest, self.timeout)
+        self._finish(job, 'done')
+        with self._lock:
+            self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id):
+        self._expire()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _start(self):
+        # Threads are started on first use so they are created after a
+        # pre-forking server has forked its workers
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name='speedread-job-%d' % i, daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            job, payload = self._queue.get()
+            try:
+                if time.monotonic() > job.deadline:
+                    if self.discard is not None:
+                        self.discard(payload)
+                    raise JobTimeout('Timed out while queued')
+                job.status = 'running'
+                self.run(job, payload)
+            except Exception as e:
+                self._finish(job, 'failed', error=str(e))
+            else:
+                self._finish(job, 'done')
+            finally:
+                self._queue.task_done()
+
+    def _finish(self, job, status, error=None):
+        job.error = error
+        job.finished_at = time.monotonic()
+        job.status = status
+
+    def _expire(self):
+        # Finished jobs are kept for ttl seconds so clients can collect them
+        cutoff = time.monotonic() - self.ttl
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.finished_at is not None and job.finished_at < cutoff
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
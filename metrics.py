@@ -0,0 +1,114 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+PAGE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000)
+WORD_BUCKETS = (100, 1000, 5000, 10000, 50000, 100000, 250000, 500000)
+BYTE_BUCKETS = (10 ** 4, 10 ** 5, 10 ** 6, 5 * 10 ** 6, 10 ** 7, 5 * 10 ** 7, 10 ** 8)
+
+
+class Metrics:
+    # Minimal Prometheus text-format registry of counters and histograms.
+    # Values are per process; each gunicorn worker reports its own.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._types = {}
+        self._buckets = {}
+        # name -> {label tuple -> value or [bucket counts, sum, count]}
+        self._values = {}
+
+    def counter(self, name, help_text):
+        self._register(name, 'counter', help_text)
+
+    def histogram(self, name, help_text, buckets):
+        self._register(name, 'histogram', help_text)
+        self._buckets[name] = tuple(buckets)
+
+    def inc(self, name, labels=None, value=1):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._values[name]
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, value, labels=None):
+        key = _label_key(labels)
+        buckets = self._buckets[name]
+        with self._lock:
+            series = self._values[name]
+            state = series.get(key)
+            if state is None:
+                state = series[key] = [[0] * len(buckets), 0.0, 0]
+            index = bisect_left(buckets, value)
+            if index < len(buckets):
+                state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, stage, sink=None):
+        # Observes the block's duration as a stage; sink collects
+        # (stage, seconds) pairs for a Server-Timing header
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe('speedread_stage_seconds', elapsed, {'stage': stage})
+            if sink is not None:
+                sink.append((stage, elapsed))
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, series in self._values.items():
+                lines.append('# HELP %s %s' % (name, self._help[name]))
+                lines.append('# TYPE %s %s' % (name, self._types[name]))
+                for key, value in sorted(series.items()):
+                    if self._types[name] == 'counter':
+                        lines.append('%s%s %s' % (name, _format_labels(key), _format_number(value)))
+                        continue
+                    counts, total, count = value
+                    cumulative = 0
+                    for bound, bucket_count in zip(self._buckets[name], counts):
+                        cumulative += bucket_count
+                        labels = _format_labels(key + (('le', _format_number(bound)),))
+                        lines.append('%s_bucket%s %d' % (name, labels, cumulative))
+                    lines.append('%s_bucket%s %d' % (name, _format_labels(key + (('le', '+Inf'),)), count))
+                    lines.append('%s_sum%s %s' % (name, _format_labels(key), _format_number(total)))
+                    lines.append('%s_count%s %d' % (name, _format_labels(key), count))
+        return '\n'.join(lines) + '\n'
+
+    def _register(self, name, kind, help_text):
+        with self._lock:
+            self._help[name] = help_text
+            self._types[name] = kind
+            self._values.setdefault(name, {})
+
+
+def server_timing(spans):
+    # Server-Timing header value, durations in milliseconds
+    return ', '.join('%s;dur=%.1f' % (stage, seconds * 1000) for stage, seconds in spans)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _format_labels(key):
+    if not key:
+        return ''
+    pairs = []
+    for name, value in key:
+        escaped = str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+        pairs.append('%s="%s"' % (name, escaped))
+    return '{%s}' % ','.join(pairs)
+
+
+def _format_number(value):
+    if isinstance(value, float) and value.is_integer():
+        return repr(int(value)) if abs(value) < 1e15 else repr(value)
+    return repr(value)
@@ -0,0 +1,25 @@
+import os
+
+try:
+    import pytesseract
+except ImportError:
+    # Optional; without it scanned PDFs are rejected instead of recognised
+    pytesseract = None
+
+# OCR is slow enough that it has to be switched on explicitly
+ENABLED = os.environ.get('SPEEDREAD_OCR') == '1'
+LANGUAGE = os.environ.get('SPEEDREAD_OCR_LANG', 'eng')
+
+
+def available():
+    return ENABLED and pytesseract is not None
+
+
+def page_text(page):
+    # Recognise the images embedded in a page; a scanned page is usually a
+    # single full-page image. page.images needs Pillow, which pytesseract
+    # depends on.
+    texts = []
+    for image in page.images:
+        texts.append(pytesseract.image_to_string(image.image, lang=LANGUAGE))
+    return '\n'.join(texts)
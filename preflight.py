@@ -0,0 +1,102 @@
+import time
+
+# Pages inspected before committing to full extraction
+SAMPLE_PAGES = 8
+# Form XObjects can nest; fonts deeper than this are not looked for
+MAX_FORM_DEPTH = 4
+
+
+class Preflight:
+    # What a cheap look at page resources says about a PDF, without parsing
+    # any content stream
+
+    def __init__(self, pages_total, sampled, text_pages, image_pages, seconds):
+        self.pages_total = pages_total
+        self.sampled = sampled
+        self.text_pages = text_pages
+        self.image_pages = image_pages
+        self.seconds = seconds
+
+    @property
+    def has_text(self):
+        return self.text_pages > 0
+
+    @property
+    def image_only(self):
+        return self.text_pages == 0 and self.image_pages > 0
+
+    def to_dict(self):
+        return {
+            'pages': self.pages_total,
+            'sampled': self.sampled,
+            'textPages': self.text_pages,
+            'imagePages': self.image_pages,
+        }
+
+
+def analyze(pdf_reader, sample_pages=SAMPLE_PAGES):
+    # Sample pages spread across the document; only when none of them can
+    # show text are the remaining pages checked too, so a text PDF costs
+    # a handful of dictionary lookups and a scan is confirmed on every page
+    start_time = time.perf_counter()
+    pages = pdf_reader.pages
+    total = len(pages)
+    if total <= sample_pages:
+        indices = list(range(total))
+    else:
+        step = (total - 1) / (sample_pages - 1)
+        indices = sorted({round(i * step) for i in range(sample_pages)})
+
+    text_pages, image_pages = _classify(pages, indices)
+    if text_pages == 0 and total > len(indices):
+        sampled = set(indices)
+        rest_text, rest_images = _classify(pages, [i for i in range(total) if i not in sampled])
+        text_pages += rest_text
+        image_pages += rest_images
+        indices = range(total)
+
+    return Preflight(total, len(indices), text_pages, image_pages, time.perf_counter() - start_time)
+
+
+def page_has_fonts(page):
+    # Text can only be drawn with a font, so a page without any font
+    # resources has nothing for extract_text to find
+    return _has_resource(page.get('/Resources'), '/Font', 0)
+
+
+def page_has_images(page):
+    return _has_resource(page.get('/Resources'), '/Image', 0)
+
+
+def _classify(pages, indices):
+    text_pages = 0
+    image_pages = 0
+    for i in indices:
+        page = pages[i]
+        if page_has_fonts(page):
+            text_pages += 1
+        elif page_has_images(page):
+            image_pages += 1
+    return text_pages, image_pages
+
+
+def _has_resource(resources, kind, depth):
+    if resources is None:
+        return False
+    resources = resources.get_object()
+    if kind == '/Font':
+        fonts = resources.get('/Font')
+        if fonts is not None and len(fonts.get_object()) > 0:
+            return True
+
+    xobjects = resources.get('/XObject')
+    if xobjects is None:
+        return False
+    for xobject in xobjects.get_object().values():
+        xobject = xobject.get_object()
+        subtype = xobject.get('/Subtype')
+        if kind == '/Image' and subtype == '/Image':
+            return True
+        if subtype == '/Form' and depth < MAX_FORM_DEPTH and _has_resource(xobject.get('/Resources'), kind, depth + 1):
+            return True
+    return False
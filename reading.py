@@ -0,0 +1,55 @@
+import re
+
+# A token that closes a sentence, allowing trailing quotes and brackets
+SENTENCE_END = re.compile(r'[.!?]+["\'\)\]”’]*$')
+CLAUSE_END = re.compile(r'[,;:–—]["\'\)\]”’]*$')
+# Same as the \w class in JavaScript regexes
+LEADING_PUNCTUATION = re.compile(r'[^A-Za-z0-9_]*')
+
+# Dwell multipliers are sent as integer tenths to keep the payload small
+BASE_DWELL = 10
+SENTENCE_DWELL = 20
+CLAUSE_DWELL = 15
+# Words longer than this get an extra tenth per character, up to the cap
+LONG_WORD = 8
+MAX_LENGTH_BONUS = 6
+
+
+def dwell_times(words):
+    # How long each word stays on screen relative to the base interval
+    dwell = []
+    for word in words:
+        if SENTENCE_END.search(word):
+            ticks = SENTENCE_DWELL
+        elif CLAUSE_END.search(word):
+            ticks = CLAUSE_DWELL
+        else:
+            ticks = BASE_DWELL
+        if len(word) > LONG_WORD:
+            ticks += min(len(word) - LONG_WORD, MAX_LENGTH_BONUS)
+        dwell.append(ticks)
+    return dwell
+
+
+def orp_offsets(words):
+    # Index of the optimal recognition point letter in each word, in UTF-16
+    # code units so the browser can slice the string with it directly
+    offsets = []
+    for word in words:
+        leading = LEADING_PUNCTUATION.match(word).end()
+        length = len(word) - leading
+        if length <= 1:
+            position = 0
+        elif length <= 5:
+            position = 1
+        elif length <= 9:
+            position = 2
+        elif length <= 13:
+            position = 3
+        else:
+            position = 4
+        index = min(leading + position, max(len(word) - 1, 0))
+        if not word.isascii():
+            index = len(word[:index].encode('utf-16-le')) // 2
+        offsets.append(index)
+    return offsets
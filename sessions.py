@@ -0,0 +1,151 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+
+from extraction import EXTRACTION_VERSION
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS documents (
+    sha256 TEXT PRIMARY KEY,
+    result BLOB NOT NULL,
+    created_at REAL NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    client TEXT NOT NULL,
+    sha256 TEXT NOT NULL REFERENCES documents (sha256),
+    title TEXT,
+    position INTEGER NOT NULL DEFAULT 0,
+    wpm INTEGER,
+    color INTEGER,
+    updated_at REAL NOT NULL,
+    UNIQUE (client, sha256)
+);
+CREATE INDEX IF NOT EXISTS sessions_by_client ON sessions (client, updated_at);
+CREATE INDEX IF NOT EXISTS sessions_by_document ON sessions (sha256);
+CREATE INDEX IF NOT EXISTS sessions_by_age ON sessions (updated_at);
+'''
+
+SESSION_FIELDS = ('id', 'sha256', 'title', 'position', 'wpm', 'color', 'updated_at')
+
+
+class SessionStore:
+    # Reading sessions and the extracted documents they refer to, in a local
+    # SQLite file. Documents are stored as zlib-compressed JSON of the same
+    # result dict the extraction cache holds, so a session can be restored
+    # without the upload. WAL mode lets every worker process share the file.
+    # Sessions untouched for max_age seconds are deleted, and with them any
+    # document no session refers to any more.
+
+    def __init__(self, path, max_age=90 * 24 * 3600, prune_interval=3600):
+        self.path = path
+        self.max_age = max_age
+        self.prune_interval = prune_interval
+        self._pruned_at = None
+        self._prune_lock = threading.Lock()
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+            columns = [row['name'] for row in db.execute('PRAGMA table_info(documents)')]
+            if 'version' not in columns:
+                # Files created before documents were versioned
+                db.execute('ALTER TABLE documents ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+
+    def _connect(self):
+        # sqlite3 connections can't be shared between threads
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10)
+            db.row_factory = sqlite3.Row
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+        return db
+
+    def has_document(self, digest):
+        row = self._connect().execute(
+            'SELECT 1 FROM documents WHERE sha256 = ? AND version = ?', (digest, EXTRACTION_VERSION)).fetchone()
+        return row is not None
+
+    def document(self, digest):
+        # A document from an older extraction version reads as missing; it is
+        # replaced the next time a session is opened for the file
+        row = self._connect().execute(
+            'SELECT result FROM documents WHERE sha256 = ? AND version = ?', (digest, EXTRACTION_VERSION)).fetchone()
+        if row is None:
+            return None
+        return json.loads(zlib.decompress(row['result']))
+
+    def put_document(self, digest, result):
+        self._prune()
+        if self.has_document(digest):
+            # Refreshed so pruning doesn't take it from under a session being opened
+            with self._connect() as db:
+                db.execute('UPDATE documents SET created_at = ? WHERE sha256 = ?', (time.time(), digest))
+            return
+        blob = zlib.compress(json.dumps(result, separators=(',', ':')).encode('utf-8'), 6)
+        with self._connect() as db:
+            db.execute('INSERT OR REPLACE INTO documents (sha256, result, created_at, version) VALUES (?, ?, ?, ?)',
+                       (digest, blob, time.time(), EXTRACTION_VERSION))
+
+    def open(self, client, digest, title=None):
+        # One session per client and document; opening it again resumes it
+        with self._connect() as db:
+            db.execute(
+                'INSERT INTO sessions (id, client, sha256, title, updated_at) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (client, sha256) DO UPDATE SET title = COALESCE(excluded.title, title)',
+                (uuid.uuid4().hex, client, digest, title, time.time()))
+        row = self._connect().execute(
+            'SELECT * FROM sessions WHERE client = ? AND sha256 = ?', (client, digest)).fetchone()
+        return _session_dict(row)
+
+    def get(self, client, session_id):
+        row = self._connect().execute(
+            'SELECT * FROM sessions WHERE id = ? AND client = ?', (session_id, client)).fetchone()
+        return _session_dict(row) if row is not None else None
+
+    def update(self, client, session_id, position=None, wpm=None, color=None):
+        with self._connect() as db:
+            cursor = db.execute(
+                'UPDATE sessions SET position = COALESCE(?, position), wpm = COALESCE(?, wpm), '
+                'color = COALESCE(?, color), updated_at = ? WHERE id = ? AND client = ?',
+                (position, wpm, color, time.time(), session_id, client))
+        return cursor.rowcount > 0
+
+    def prune(self):
+        # Returns the number of sessions and documents deleted. A document
+        # stored within max_age is kept even without a session, as one may
+        # be about to be opened for it.
+        cutoff = time.time() - self.max_age
+        with self._connect() as db:
+            sessions = db.execute('DELETE FROM sessions WHERE updated_at < ?', (cutoff,)).rowcount
+            documents = db.execute(
+                'DELETE FROM documents WHERE created_at < ? AND NOT EXISTS '
+                '(SELECT 1 FROM sessions WHERE sessions.sha256 = documents.sha256)', (cutoff,)).rowcount
+        return sessions, documents
+
+    def _prune(self):
+        # At most once per prune_interval in each process
+        now = time.monotonic()
+        with self._prune_lock:
+            if self._pruned_at is not None and now - self._pruned_at < self.prune_interval:
+                return
+            self._pruned_at = now
+        self.prune()
+
+    def recent(self, client, limit=20):
+        rows = self._connect().execute(
+            'SELECT * FROM sessions WHERE client = ? ORDER BY updated_at DESC LIMIT ?', (client, limit)).fetchall()
+        return [_session_dict(row) for row in rows]
+
+
+def _session_dict(row):
+    return {field: row[field] for field in SESSION_FIELDS}
@@ -1,1053 +1,747 @@
-from flask import Flask, render_template_string, request, jsonify
-import PyPDF2
-import io
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from flask import Flask, Response, g, has_request_context, render_template, request, jsonify
+from werkzeug.exceptions import RequestEntityTooLarge
+import base64
+import hashlib
+import json
 import re
 import os
+import tempfile
+import uuid
+
+from assets import StaticAssets
+from compression import MIN_SIZE, Precompressed, available_encodings, choose_encoding, compress, is_compressible
+from extraction import DocumentBuilder, TooManyPages, encode_boxes
+from document_cache import DocumentCache, DocumentClosed
+from extractors import (
+    CachedDocument, NoTextLayer, PageRangeError, UnsupportedFormat, extract_document, extract_pages, open_document,
+    parse_page_ranges,
+)
+from extraction_cache import ExtractionCache
+from jobs import JobQueue, QueueFull
+from metrics import BYTE_BUCKETS, PAGE_BUCKETS, SECONDS_BUCKETS, WORD_BUCKETS, Metrics, server_timing
+from sessions import SessionStore
+from uploads import UploadedFile
+import wordpack
 
 app = Flask(__name__, static_folder='static')
 
-HTML_TEMPLATE = '''
-<!DOCTYPE html>
-<html>
-<head>
-    <title>PDF Speed Reader</title>
-    <script src="https://cdnjs.cloudflare.com/ajax/libs/pdf.js/3.11.174/pdf.min.js"></script>
-    <script>
-        // Check if PDF.js loaded
-        if (typeof pdfjsLib !== 'undefined') {
-            pdfjsLib.GlobalWorkerOptions.workerSrc = 'https://cdnjs.cloudflare.com/ajax/libs/pdf.js/3.11.174/pdf.worker.min.js';
-            console.log('PDF.js loaded successfully');
-        } else {
-            console.error('PDF.js failed to load');
-        }
-    </script>
-    <style>
-        :root {
-            --bg-primary: #f8f9fa;
-            --bg-secondary: #ffffff;
-            --bg-tertiary: #fafafa;
-            --text-primary: #1a1a1a;
-            --text-secondary: #666;
-            --border-color: #d0d0d0;
-            --accent-color: #2d8659;
-            --accent-dark: #1f5a3d;
-            --accent-light: #c92a2a;
-            --color-red: #c92a2a;
-            --color-orange: #d97706;
-            --color-yellow: #b8860b;
-            --color-green: #059669;
-            --color-blue: #2563eb;
-            --slider-color: #5b9fb5;
-        }
-        
-        [data-theme="dark"] {
-            --bg-primary: #1a1a1a;
-            --bg-secondary: #2d2d2d;
-            --bg-tertiary: #3a3a3a;
-            --text-primary: #e9e9e9;
-            --text-secondary: #b0b0b0;
-            --border-color: #555;
-            --accent-color: #4a9f6f;
-            --accent-dark: #2d8659;
-            --accent-light: #ff6b6b;
-            --color-red: #ff6b6b;
-            --color-orange: #fb923c;
-            --color-yellow: #eab308;
-            --color-green: #10b981;
-            --color-blue: #3b82f6;
-            --slider-color: #64b5d6;
-        }
-        
-        * {
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }
-        body {
-            font-family: 'Bahnschrift', 'DIN Alternate', 'Franklin Gothic Medium', 'Nimbus Sans Narrow', sans-serif-condensed, sans-serif;
-            background: linear-gradient(135deg, var(--bg-primary) 0%, var(--bg-tertiary) 100%);
-            min-height: 100vh;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            padding: 20px;
-            color: var(--text-primary);
-            transition: background 0.3s ease;
-            gap: 20px;
-        }
-        .main-layout {
-            display: flex;
-            gap: 20px;
-            width: 100%;
-            max-width: 1400px;
-            align-items: flex-start;
-            overflow: hidden;
-        }
-        .container {
-            background: var(--bg-secondary);
-            border-radius: 16px;
-            box-shadow: 0 10px 40px rgba(0, 0, 0, 0.1);
-            flex: 1;
-            min-width: 0;
-            padding: 30px 40px;
-            transition: background 0.3s ease, box-shadow 0.3s ease;
-        }
-        .pdf-sidebar {
-            width: 300px;
-            min-width: 200px;
-            max-width: 600px;
-            background: var(--bg-secondary);
-            border-radius: 16px;
-            box-shadow: 0 10px 40px rgba(0, 0, 0, 0.1);
-            padding: 20px;
-            max-height: 90vh;
-            overflow-y: auto;
-            transition: background 0.3s ease, box-shadow 0.3s ease;
-            display: none;
-        }
-        .pdf-sidebar.active {
-            display: block;
-        }
-        .pdf-sidebar h3 {
-            margin-bottom: 15px;
-            font-size: 16px;
-            color: var(--text-primary);
-            text-align: center;
-        }
-        .pdf-page-container {
-            position: relative;
-            margin-bottom: 15px;
-            border: 2px solid var(--border-color);
-            border-radius: 8px;
-            overflow: hidden;
-            background: white;
-        }
-        .pdf-page-container canvas {
-            width: 100%;
-            height: auto;
-            display: block;
-        }
-        .pdf-page-label {
-            position: absolute;
-            top: 5px;
-            right: 5px;
-            background: rgba(0, 0, 0, 0.7);
-            color: white;
-            padding: 3px 8px;
-            border-radius: 4px;
-            font-size: 11px;
-            font-weight: bold;
-        }
-        .word-highlight-overlay {
-            position: absolute;
-            background: rgba(91, 159, 181, 0.4);
-            border: 2px solid var(--slider-color);
-            pointer-events: none;
-            border-radius: 3px;
-            transition: all 0.3s ease;
-        }
-        .pdf-sidebar::-webkit-scrollbar {
-            width: 8px;
-        }
-        .pdf-sidebar::-webkit-scrollbar-track {
-            background: var(--bg-tertiary);
-            border-radius: 4px;
-        }
-        .pdf-sidebar::-webkit-scrollbar-thumb {
-            background: var(--slider-color);
-            border-radius: 4px;
-        }
-        .pdf-sidebar::-webkit-scrollbar-thumb:hover {
-            background: var(--accent-color);
-        }
-        .logo-section {
-            display: flex;
-            justify-content: center;
-            margin-bottom: 10px;
-        }
-        .logo {
-            height: 180px;
-            width: auto;
-            border-radius: 8px;
-            transition: transform 0.3s ease;
-        }
-        .logo:hover {
-            transform: scale(1.05);
-        }
-        .header {
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-            margin-bottom: 15px;
-            gap: 12px;
-        }
-        .upload-section {
-            margin: 0;
-            padding: 6px 10px;
-            border: 2px dashed var(--border-color);
-            border-radius: 8px;
-            text-align: center;
-            background: var(--bg-tertiary);
-            transition: all 0.3s ease;
-        }
-        .upload-section p {
-            color: var(--text-secondary);
-            margin-top: 2px;
-            font-size: 11px;
-            font-family: 'Bahnschrift', 'DIN Alternate', 'Franklin Gothic Medium', 'Nimbus Sans Narrow', sans-serif-condensed, sans-serif;
-        }
-        .color-buttons {
-            display: flex;
-            gap: 6px;
-            justify-content: center;
-            margin: 0;
-            flex-wrap: nowrap;
-        }
-        .color-btn {
-            padding: 8px 12px;
-            border: 3px solid transparent;
-            border-radius: 6px;
-            cursor: pointer;
-            font-weight: 600;
-            font-family: 'Bahnschrift', 'DIN Alternate', 'Franklin Gothic Medium', 'Nimbus Sans Narrow', sans-serif-condensed, sans-serif;
-            font-size: 12px;
-            text-transform: capitalize;
-            transition: all 0.3s ease;
-            white-space: nowrap;
-        }
-        .color-btn:hover {
-            transform: translateY(-2px);
-            box-shadow: 0 4px 12px rgba(0, 0, 0, 0.2);
-        }
-        .color-btn.active {
-            border-color: var(--text-primary);
-            box-shadow: 0 0 0 3px var(--bg-secondary);
-        }
-        .color-btn.red {
-            background: var(--color-red);
-            color: white;
-        }
-        .color-btn.orange {
-            background: var(--color-orange);
-            color: white;
-        }
-        .color-btn.yellow {
-            background: var(--color-yellow);
-            color: #1a1a1a;
-        }
-        .color-btn.green {
-            background: var(--color-green);
-            color: white;
-        }
-        .color-btn.blue {
-            background: var(--color-blue);
-            color: white;
-        }
-            background: var(--bg-tertiary);
-            border: 2px solid var(--border-color);
-            border-radius: 8px;
-            padding: 8px 12px;
-            cursor: pointer;
-            font-size: 14px;
-            color: var(--text-primary);
-            transition: all 0.3s ease;
-            font-family: 'Bahnschrift', 'DIN Alternate', 'Franklin Gothic Medium', 'Nimbus Sans Narrow', sans-serif-condensed, sans-serif;
-            font-weight: 600;
-            white-space: nowrap;
-        }
-        .controls {
-            margin: 50px 0 40px 0;
-        }
-        .control-group {
-            margin: 30px 0;
-        }
-        label {
-            display: block;
-            margin-bottom: 12px;
-            font-weight: 600;
-            color: var(--text-primary);
-            font-size: 14px;
-            text-transform: uppercase;
-            letter-spacing: 0.5px;
-            font-family: 'Bahnschrift', 'DIN Alternate', 'Franklin Gothic Medium', 'Nimbus Sans Narrow', sans-serif-condensed, sans-serif;
-        }
-        input[type="range"] {
-            width: 100%;
-            height: 8px;
-            border-radius: 4px;
-            background: linear-gradient(to right, var(--border-color) 0%, var(--border-color) 100%);
-            outline: none;
-            -webkit-appearance: none;
-            appearance: none;
-        }
-        input[type="range"]::-webkit-slider-thumb {
-            -webkit-appearance: none;
-            appearance: none;
-            width: 24px;
-            height: 24px;
-            border-radius: 50%;
-            background: var(--slider-color);
-            cursor: pointer;
-            box-shadow: 0 2px 8px rgba(91, 159, 181, 0.3);
-            transition: box-shadow 0.2s ease;
-        }
-        input[type="range"]::-webkit-slider-thumb:hover {
-            box-shadow: 0 4px 12px rgba(91, 159, 181, 0.5);
-        }
-        input[type="range"]::-moz-range-thumb {
-            width: 24px;
-            height: 24px;
-            border-radius: 50%;
-            background: var(--slider-color);
-            cursor: pointer;
-            border: none;
-            box-shadow: 0 2px 8px rgba(91, 159, 181, 0.3);
-            transition: box-shadow 0.2s ease;
-        }
-        input[type="range"]::-moz-range-thumb:hover {
-            box-shadow: 0 4px 12px rgba(91, 159, 181, 0.5);
-        }
-        .slider-label {
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-            margin-bottom: 8px;
-        }
-        .jump-to-word {
-            display: flex;
-            gap: 8px;
-            align-items: center;
-            margin-top: 10px;
-        }
-        .jump-to-word input {
-            width: 80px;
-            padding: 6px 8px;
-            border: 2px solid var(--border-color);
-            border-radius: 6px;
-            background: var(--bg-tertiary);
-            color: var(--text-primary);
-            font-family: 'Bahnschrift', 'DIN Alternate', 'Franklin Gothic Medium', 'Nimbus Sans Narrow', sans-serif-condensed, sans-serif;
-            font-size: 12px;
-            transition: border-color 0.3s ease;
-        }
-        .jump-to-word input:focus {
-            outline: none;
-            border-color: var(--slider-color);
-        }
-        .jump-to-word button {
-            padding: 6px 12px;
-            font-size: 12px;
-            background: var(--slider-color);
-            color: white;
-            border: none;
-            border-radius: 6px;
-            cursor: pointer;
-            font-family: 'Bahnschrift', 'DIN Alternate', 'Franklin Gothic Medium', 'Nimbus Sans Narrow', sans-serif-condensed, sans-serif;
-            font-weight: 600;
-            transition: opacity 0.3s ease;
-        }
-        .jump-to-word button:hover {
-            opacity: 0.9;
-        }
-        .buttons {
-            display: flex;
-            gap: 12px;
-            justify-content: center;
-            margin: 40px 0;
-        }
-        button {
-            padding: 14px 36px;
-            font-size: 16px;
-            border: none;
-            border-radius: 8px;
-            cursor: pointer;
-            font-weight: 600;
-            transition: all 0.3s ease;
-            letter-spacing: 0.5px;
-            font-family: 'Bahnschrift', 'DIN Alternate', 'Franklin Gothic Medium', 'Nimbus Sans Narrow', sans-serif-condensed, sans-serif;
-        }
-        #playPauseBtn {
-            background: linear-gradient(135deg, var(--accent-color) 0%, var(--accent-dark) 100%);
-            color: white;
-            min-width: 120px;
-            box-shadow: 0 4px 12px rgba(45, 134, 89, 0.3);
-        }
-        #playPauseBtn:hover:not(:disabled) {
-            transform: translateY(-2px);
-            box-shadow: 0 6px 16px rgba(45, 134, 89, 0.4);
-        }
-        #playPauseBtn:disabled {
-            background: var(--border-color);
-            cursor: not-allowed;
-            box-shadow: none;
-        }
-        .info {
-            text-align: center;
-            color: var(--text-secondary);
-            margin: 25px 0;
-            font-size: 15px;
-            font-weight: 500;
-            font-family: 'Bahnschrift', 'DIN Alternate', 'Franklin Gothic Medium', 'Nimbus Sans Narrow', sans-serif-condensed, sans-serif;
-        }
-        .stats-section {
-            margin: 12px 0;
-            padding: 12px;
-            background: var(--bg-tertiary);
-            border-radius: 12px;
-            border: 1px solid var(--border-color);
-        }
-        .stats-grid {
-            display: grid;
-            grid-template-columns: repeat(6, 1fr);
-            gap: 8px;
-        }
-        .stat-item {
-            text-align: center;
-            padding: 8px;
-        }
-        .stat-value {
-            font-size: 18px;
-            font-weight: 700;
-            color: var(--accent-color);
-            margin-bottom: 2px;
-        }
-        .stat-label {
-            font-size: 10px;
-            color: var(--text-secondary);
-            text-transform: uppercase;
-            letter-spacing: 0.3px;
-            font-weight: 600;
-        }
-        #wordDisplay {
-            font-size: 96px;
-            min-height: 140px;
-            margin: 25px 0 15px 0;
-            font-weight: 600;
-            color: var(--text-primary);
-            font-family: 'Bahnschrift', 'DIN Alternate', 'Franklin Gothic Medium', 'Nimbus Sans Narrow', sans-serif-condensed, sans-serif;
-            letter-spacing: 1px;
-            position: relative;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            line-height: 1.2;
-            transition: color 0.3s ease;
-        }
-        .word-container {
-            display: inline-block;
-            white-space: nowrap;
-        }
-        .orp {
-            color: var(--accent-light);
-            font-weight: 700;
-        }
-    </style>
-</head>
-<body>
-    <div class="main-layout">
-        <div class="container">
-            <div class="logo-section">
-                <img id="logoImage" src="/static/speedread_logo.png" alt="Speed Reader Logo" class="logo">
-            </div>
-        
-        <div class="header">
-            <div class="upload-section">
-                <input type="file" id="pdfFile" accept=".pdf">
-                <p>Upload a PDF to begin</p>
-            </div>
-            <div class="color-buttons">
-                <button class="color-btn red active" data-color="0">Red</button>
-                <button class="color-btn orange" data-color="1">Orange</button>
-                <button class="color-btn yellow" data-color="2">Yellow</button>
-                <button class="color-btn green" data-color="3">Green</button>
-                <button class="color-btn blue" data-color="4">Blue</button>
-            </div>
-            <button class="theme-toggle" id="themeToggle">🌙 Dark Mode</button>
-        </div>
-
-        <div id="readerSection" class="hidden">
-            <div id="statsSection" class="stats-section hidden">
-                <div class="stats-grid">
-                    <div class="stat-item">
-                        <div class="stat-value" id="statTotalWords">0</div>
-                        <div class="stat-label">Total Words</div>
-                    </div>
-                    <div class="stat-item">
-                        <div class="stat-value" id="statUniqueWords">0</div>
-                        <div class="stat-label">Unique Words</div>
-                    </div>
-                    <div class="stat-item">
-                        <div class="stat-value" id="statDiversity">0%</div>
-                        <div class="stat-label">Lexical Diversity</div>
-                    </div>
-                    <div class="stat-item">
-                        <div class="stat-value" id="statAvgWordLen">0</div>
-                        <div class="stat-label">Avg Word Length</div>
-                    </div>
-                    <div class="stat-item">
-                        <div class="stat-value" id="statAvgSentenceLen">0</div>
-                        <div class="stat-label">Avg Sentence Length</div>
-                    </div>
-                    <div class="stat-item">
-                        <div class="stat-value" id="statReadingLevel">0</div>
-                        <div class="stat-label">Reading Level</div>
-                    </div>
-                </div>
-            </div>
-            
-            <div id="wordDisplay">Ready</div>
-            
-            <div class="info">
-                <span>Word <span id="currentWord">0</span> of <span id="totalWords">0</span></span>
-            </div>
-
-            <div class="buttons">
-                <button id="playPauseBtn" disabled>Play</button>
-            </div>
-
-            <div class="controls">
-                <div class="control-group">
-                    <div class="slider-label">
-                        <label for="wpmSlider">Speed: <span id="wpmValue">300</span> WPM</label>
-                    </div>
-                    <input type="range" id="wpmSlider" min="50" max="1000" value="300" step="10">
-                </div>
-
-                <div class="control-group">
-                    <div class="slider-label">
-                        <label for="fontSizeSlider">Text Size: <span id="fontSizeValue">96</span>px</label>
-                    </div>
-                    <input type="range" id="fontSizeSlider" min="48" max="150" value="96" step="2">
-                </div>
-
-                <div class="control-group">
-                    <div class="slider-label">
-                        <label for="positionSlider">Position: <span id="positionValue">1</span> / <span id="totalWordsLabel">0</span></label>
-                    </div>
-                    <input type="range" id="positionSlider" min="0" max="100" value="0" step="1">
-                    <div class="jump-to-word">
-                        <label for="jumpInput" style="font-size: 12px; margin: 0;">Jump to word:</label>
-                        <input type="number" id="jumpInput" placeholder="Word #" min="1">
-                        <button id="jumpBtn">Go</button>
-                    </div>
-                </div>
-            </div>
-        </div>
-    </div>
-
-    <script>
-        let words = [];
-        let currentIndex = 0;
-        let isPlaying = false;
-        let intervalId = null;
-        let wpm = 300;
-        let currentColorIndex = 0;
-        const colorNames = ['red', 'orange', 'yellow', 'green', 'blue'];
-        const colors = {
-            red: 'var(--color-red)',
-            orange: 'var(--color-orange)',
-            yellow: 'var(--color-yellow)',
-            green: 'var(--color-green)',
-            blue: 'var(--color-blue)'
-        };
-
-        const pdfFile = document.getElementById('pdfFile');
-        const wordDisplay = document.getElementById('wordDisplay');
-        const playPauseBtn = document.getElementById('playPauseBtn');
-        const wpmSlider = document.getElementById('wpmSlider');
-        const wpmValue = document.getElementById('wpmValue');
-        const positionSlider = document.getElementById('positionSlider');
-        const currentWordSpan = document.getElementById('currentWord');
-        const totalWordsSpan = document.getElementById('totalWords');
-        const readerSection = document.getElementById('readerSection');
-        const statsSection = document.getElementById('statsSection');
-        const fontSizeSlider = document.getElementById('fontSizeSlider');
-        const fontSizeValue = document.getElementById('fontSizeValue');
-        const positionValue = document.getElementById('positionValue');
-        const totalWordsLabel = document.getElementById('totalWordsLabel');
-        const jumpInput = document.getElementById('jumpInput');
-        const jumpBtn = document.getElementById('jumpBtn');
-
-        // PDF Preview variables
-        let pdfDoc = null;
-        let pdfPages = [];
-        let wordPositions = [];
-        const pdfSidebar = document.getElementById('pdfSidebar');
-        const pdfPagesContainer = document.getElementById('pdfPagesContainer');
-
-        // Color buttons
-        const colorButtons = document.querySelectorAll('.color-btn');
-        const savedColorIndex = localStorage.getItem('highlightColorIndex') || '0';
-        currentColorIndex = parseInt(savedColorIndex);
-        
-        // Set active button on load
-        colorButtons.forEach(btn => {
-            if (btn.dataset.color === savedColorIndex) {
-                btn.classList.add('active');
-            }
-        });
-        
-        colorButtons.forEach(btn => {
-            btn.addEventListener('click', () => {
-                colorButtons.forEach(b => b.classList.remove('active'));
-                btn.classList.add('active');
-                currentColorIndex = parseInt(btn.dataset.color);
-                localStorage.setItem('highlightColorIndex', currentColorIndex);
-                updateDisplay();
-            });
-        });
-
-        pdfFile.addEventListener('change', async (e) => {
-            const file = e.target.files[0];
-            if (!file) return;
-
-            const formData = new FormData();
-            formData.append('pdf', file);
-
-            try {
-                const response = await fetch('/upload', {
-                    method: 'POST',
-                    body: formData
-                });
-
-                const data = await response.json();
-                
-                if (data.words && data.words.length > 0) {
-                    words = data.words;
-                    currentIndex = 0;
-                    updateDisplay();
-                    readerSection.classList.remove('hidden');
-                    statsSection.classList.remove('hidden');
-                    playPauseBtn.disabled = false;
-                    positionSlider.max = words.length - 1;
-                    totalWordsSpan.textContent = words.length;
-                    totalWordsLabel.textContent = words.length;
-                    jumpInput.max = words.length;
-                    
-                    // Calculate and display statistics
-                    calculateAndDisplayStats(data.words, data.originalText);
-                    
-                    // Render PDF preview (completely optional, non-blocking)
-                    setTimeout(() => {
-                        if (typeof renderPDFPreview === 'function') {
-                            renderPDFPreview(file).catch(err => {
-                                console.error('PDF preview failed:', err);
-                            });
-                        }
-                    }, 100);
-                } else {
-                    alert('No text found in PDF');
-                }
-            } catch (error) {
-                alert('Error processing PDF: ' + error.message);
-            }
-        });
-
-        playPauseBtn.addEventListener('click', () => {
-            if (isPlaying) {
-                pause();
-            } else {
-                play();
-            }
-        });
-
-        wpmSlider.addEventListener('input', (e) => {
-            wpm = parseInt(e.target.value);
-            wpmValue.textContent = wpm;
-            if (isPlaying) {
-                pause();
-                play();
-            }
-        });
-
-        fontSizeSlider.addEventListener('input', (e) => {
-            const fontSize = parseInt(e.target.value);
-            fontSizeValue.textContent = fontSize;
-            wordDisplay.style.fontSize = fontSize + 'px';
-        });
+# Static files under content-hashed /assets/ URLs
+assets = StaticAssets(app.static_folder)
+ASSET_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Larger request bodies are refused with a 413 before they are read
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('SPEEDREAD_MAX_UPLOAD_BYTES', 100 * 1024 * 1024))
+# Documents with more pages are refused once the page tree has been read
+MAX_PAGES = int(os.environ.get('SPEEDREAD_MAX_PAGES', 2000))
+
+# Shared by all workers on the host through the on-disk spill directory
+extraction_cache = ExtractionCache(
+    max_bytes=int(os.environ.get('SPEEDREAD_CACHE_BYTES', 64 * 1024 * 1024)),
+    spill_dir=os.environ.get('SPEEDREAD_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'speedread-cache')),
+    max_disk_bytes=int(os.environ.get('SPEEDREAD_CACHE_DISK_BYTES', 1024 * 1024 * 1024)),
+)
+
+# Reading positions and the documents they refer to; unlike the cache it is kept
+session_store = SessionStore(
+    os.environ.get('SPEEDREAD_SESSION_DB', os.path.join(app.instance_path, 'speedread.sqlite3')),
+    max_age=float(os.environ.get('SPEEDREAD_SESSION_DAYS', 90)) * 24 * 3600,
+)
+# Parsed documents held open so more page ranges can be read without a new upload
+open_documents = DocumentCache(
+    max_entries=int(os.environ.get('SPEEDREAD_OPEN_DOCUMENTS', 16)),
+    ttl=float(os.environ.get('SPEEDREAD_OPEN_DOCUMENT_TTL', 300)),
+)
+
+# Anonymous per-browser token that scopes sessions
+CLIENT_COOKIE = 'speedread_client'
+CLIENT_COOKIE_MAX_AGE = 365 * 24 * 3600
+
+registry = Metrics()
+registry.histogram('speedread_stage_seconds', 'Time spent in each upload stage.', SECONDS_BUCKETS)
+registry.histogram('speedread_document_pages', 'Pages per extracted document.', PAGE_BUCKETS)
+registry.histogram('speedread_document_words', 'Words per extracted document.', WORD_BUCKETS)
+registry.histogram('speedread_upload_bytes', 'Size of uploaded files in bytes.', BYTE_BUCKETS)
+registry.counter('speedread_extraction_errors_total', 'Failed extractions by exception type.')
+registry.counter('speedread_cache_lookups_total', 'Extraction cache lookups by result.')
+
+# Files accepted by one /upload/batch request, and threads extracting them
+MAX_BATCH_FILES = int(os.environ.get('SPEEDREAD_MAX_BATCH_FILES', 50))
+batch_pool = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('SPEEDREAD_BATCH_WORKERS', 4)), thread_name_prefix='speedread-batch')
+
+# Largest slice /doc/<id>/words will return at once
+MAX_WORD_WINDOW = 10000
+
+# Send a Server-Timing breakdown on every response, not only when ?timing=1 asks
+SERVER_TIMING = os.environ.get('SPEEDREAD_SERVER_TIMING') == '1'
+
+def timing_sink():
+    # Spans collected for this request's Server-Timing header
+    if not has_request_context():
+        return None
+    if 'server_timing' not in g:
+        g.server_timing = []
+    return g.server_timing
+
+def stage(name):
+    return registry.time(name, timing_sink())
+
+def record_timings(timings):
+    sink = timing_sink()
+    for name, seconds in timings.items():
+        registry.observe('speedread_stage_seconds', seconds, {'stage': name})
+        if sink is not None:
+            sink.append((name, seconds))
+
+def record_document(result, upload_size):
+    registry.observe('speedread_document_pages', len(result['page_offsets']))
+    registry.observe('speedread_document_words', len(result['words']))
+    registry.observe('speedread_upload_bytes', upload_size)
+
+def record_error(error):
+    registry.inc('speedread_extraction_errors_total', {'type': type(error).__name__})
+
+# Errors caused by the upload or the request, and their status codes; anything
+# else is a 500 and counted as an extraction error
+ERROR_STATUS = (
+    (PageRangeError, 400),
+    (TooManyPages, 413),
+    (UnsupportedFormat, 415),
+    (NoTextLayer, 422),
+)
+
+def error_status(error):
+    for error_type, status in ERROR_STATUS:
+        if isinstance(error, error_type):
+            return status
+    record_error(error)
+    return 500
+
+def error_response(error):
+    return jsonify({'error': str(error)}), error_status(error)
+
+def cached_extraction(digest):
+    result = extraction_cache.get(digest)
+    outcome = 'hit'
+    if result is None:
+        # Documents with a reading session outlive the cache
+        result = session_store.document(digest)
+        outcome = 'miss' if result is None else 'session_store'
+        if result is not None:
+            extraction_cache.put(digest, result)
+    registry.inc('speedread_cache_lookups_total', {'result': outcome})
+    return result
+
+@app.after_request
+def add_server_timing(response):
+    spans = g.get('server_timing')
+    if spans and (SERVER_TIMING or request.args.get('timing')):
+        response.headers['Server-Timing'] = server_timing(spans)
+    return response
+
+@app.errorhandler(RequestEntityTooLarge)
+def upload_too_large(e):
+    limit = app.config['MAX_CONTENT_LENGTH']
+    return jsonify({'error': 'Upload is larger than the limit of %d bytes' % limit}), 413
+
+@app.after_request
+def compress_response(response):
+    # Dynamic responses such as upload payloads; the index page and assets
+    # carry precompressed variants and already have Content-Encoding set
+    if (response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers
+            or response.status_code in (204, 304) or not is_compressible(response.mimetype)):
+        return response
+    data = response.get_data()
+    if len(data) < MIN_SIZE:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request.accept_encodings, available_encodings())
+    if encoding is not None:
+        with stage('compress'):
+            response.set_data(compress(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+def precompressed_response(body, cache_control):
+    encoding, data = body.select(request.accept_encodings)
+    if any(request.if_none_match.contains(etag) for etag in body.etags()):
+        response = Response(status=304)
+    else:
+        response = Response(data, mimetype=body.mimetype)
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(body.etag(encoding))
+    response.headers['Cache-Control'] = cache_control
+    response.vary.add('Accept-Encoding')
+    return response
+
+@app.route('/metrics')
+def metrics():
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+# The page has no per-request content, so it is rendered and compressed once
+with app.app_context():
+    index_page = Precompressed(render_template('index.html', asset_url=assets.url).encode('utf-8'), 'text/html')
 
-        positionSlider.addEventListener('input', (e) => {
-            currentIndex = parseInt(e.target.value);
-            positionValue.textContent = currentIndex + 1;
-            updateDisplay();
-        });
-
-        jumpBtn.addEventListener('click', () => {
-            const jumpTo = parseInt(jumpInput.value);
-            if (jumpTo && jumpTo > 0 && jumpTo <= words.length) {
-                currentIndex = jumpTo - 1;
-                positionSlider.value = currentIndex;
-                positionValue.textContent = currentIndex + 1;
-                updateDisplay();
-                jumpInput.value = '';
-            } else {
-                alert('Please enter a valid word number between 1 and ' + words.length);
-            }
-        });
-
-        jumpInput.addEventListener('keypress', (e) => {
-            if (e.key === 'Enter') {
-                jumpBtn.click();
-            }
-        });
-
-        function play() {
-            isPlaying = true;
-            playPauseBtn.textContent = 'Pause';
-            const msPerWord = 60000 / wpm;
-            
-            intervalId = setInterval(() => {
-                if (currentIndex >= words.length - 1) {
-                    pause();
-                    return;
-                }
-                currentIndex++;
-                updateDisplay();
-            }, msPerWord);
-        }
-
-        function pause() {
-            isPlaying = false;
-            playPauseBtn.textContent = 'Play';
-            if (intervalId) {
-                clearInterval(intervalId);
-                intervalId = null;
-            }
-        }
-
-        function updateDisplay() {
-            if (words.length > 0) {
-                const word = words[currentIndex];
-                const orpIndex = calculateORP(word);
-                
-                // Split word into three parts: before ORP, ORP letter, after ORP
-                const before = word.substring(0, orpIndex);
-                const orp = word.charAt(orpIndex);
-                const after = word.substring(orpIndex + 1);
-                
-                const currentColor = colorNames[currentColorIndex];
-                const colorValue = getComputedStyle(document.documentElement).getPropertyValue(`--color-${currentColor}`).trim();
-                wordDisplay.innerHTML = `<div class="word-container"><span>${before}</span><span class="orp" style="color: ${colorValue};">${orp}</span><span>${after}</span></div>`;
-                
-                // Calculate offset to center the ORP letter
-                setTimeout(() => {
-                    const container = wordDisplay.querySelector('.word-container');
-                    const orpElement = wordDisplay.querySelector('.orp');
-                    if (container && orpElement) {
-                        const containerRect = wordDisplay.getBoundingClientRect();
-                        const orpRect = orpElement.getBoundingClientRect();
-                        const orpCenter = orpRect.left + orpRect.width / 2;
-                        const containerCenter = containerRect.left + containerRect.width / 2;
-                        const offset = containerCenter - orpCenter;
-                        container.style.transform = `translateX(${offset}px)`;
-                    }
-                }, 0);
-                
-                positionSlider.value = currentIndex;
-                currentWordSpan.textContent = currentIndex + 1;
-                
-                // Update PDF highlight
-                highlightCurrentWord();
-            }
-        }
-
-        function calculateORP(word) {
-            // Remove leading punctuation to find the actual word start
-            let leadingPunct = 0;
-            while (leadingPunct < word.length && /[^\w]/.test(word[leadingPunct])) {
-                leadingPunct++;
-            }
-            
-            // Calculate ORP position (approximately 1/3 into the word for optimal recognition)
-            const effectiveLength = word.length - leadingPunct;
-            let orpPosition;
-            
-            if (effectiveLength <= 1) {
-                orpPosition = 0;
-            } else if (effectiveLength <= 5) {
-                orpPosition = 1;
-            } else if (effectiveLength <= 9) {
-                orpPosition = 2;
-            } else if (effectiveLength <= 13) {
-                orpPosition = 3;
-            } else {
-                orpPosition = 4;
-            }
-            
-            return leadingPunct + orpPosition;
-        }
-
-        function calculateAndDisplayStats(wordList, originalText) {
-            const totalWords = wordList.length;
-            const uniqueWords = new Set(wordList.map(w => w.toLowerCase())).size;
-            const lexicalDiversity = ((uniqueWords / totalWords) * 100).toFixed(1);
-            
-            const avgWordLength = (wordList.reduce((sum, w) => sum + w.length, 0) / totalWords).toFixed(1);
-            
-            // Detect sentences (rough estimate)
-            const sentences = originalText.split(/[.!?]+/).filter(s => s.trim().length > 0).length || 1;
-            const avgSentenceLength = (totalWords / sentences).toFixed(1);
-            
-            // Flesch-Kincaid grade level estimate
-            const syllables = wordList.reduce((sum, w) => sum + countSyllables(w), 0);
-            const readingLevel = Math.max(0, (0.39 * (totalWords / sentences) + 11.8 * (syllables / totalWords) - 15.59).toFixed(1));
-            
-            document.getElementById('statTotalWords').textContent = totalWords.toLocaleString();
-            document.getElementById('statUniqueWords').textContent = uniqueWords.toLocaleString();
-            document.getElementById('statDiversity').textContent = lexicalDiversity + '%';
-            document.getElementById('statAvgWordLen').textContent = avgWordLength;
-            document.getElementById('statAvgSentenceLen').textContent = avgSentenceLength;
-            document.getElementById('statReadingLevel').textContent = readingLevel;
-        }
-
-        function countSyllables(word) {
-            word = word.toLowerCase();
-            let count = 0;
-            const vowels = 'aeiouy';
-            let previousWasVowel = false;
-
-            for (let char of word) {
-                const isVowel = vowels.includes(char);
-                if (isVowel && !previousWasVowel) {
-                    count++;
-                }
-                previousWasVowel = isVowel;
-            }
-
-            if (word.endsWith('e')) count--;
-            if (word.endsWith('le') && word.length > 2 && !vowels.includes(word[word.length - 3])) count++;
-            
-            return Math.max(1, count);
-        }
-
-        // PDF Preview Functions
-        async function renderPDFPreview(file) {
-            try {
-                console.log('Starting PDF preview render...');
-                
-                // Check if PDF.js is available
-                if (typeof pdfjsLib === 'undefined') {
-                    console.error('PDF.js library not loaded');
-                    return;
-                }
-                
-                const pdfSidebar = document.getElementById('pdfSidebar');
-                const pdfPagesContainer = document.getElementById('pdfPagesContainer');
-                
-                if (!pdfSidebar || !pdfPagesContainer) {
-                    console.error('PDF sidebar elements not found');
-                    return;
-                }
-                
-                const arrayBuffer = await file.arrayBuffer();
-                pdfDoc = await pdfjsLib.getDocument({data: arrayBuffer}).promise;
-                console.log('PDF loaded, pages:', pdfDoc.numPages);
-                
-                pdfPagesContainer.innerHTML = '';
-                pdfPages = [];
-                
-                // Show sidebar immediately
-                pdfSidebar.classList.add('active');
-                
-                // Render all pages
-                for (let pageNum = 1; pageNum <= pdfDoc.numPages; pageNum++) {
-                    try {
-                        const page = await pdfDoc.getPage(pageNum);
-                        const scale = 0.5; // Scale down for sidebar
-                        const viewport = page.getViewport({scale: scale});
-                        
-                        const pageContainer = document.createElement('div');
-                        pageContainer.className = 'pdf-page-container';
-                        pageContainer.id = `pdf-page-${pageNum}`;
-                        
-                        const canvas = document.createElement('canvas');
-                        const context = canvas.getContext('2d');
-                        canvas.height = viewport.height;
-                        canvas.width = viewport.width;
-                        
-                        const pageLabel = document.createElement('div');
-                        pageLabel.className = 'pdf-page-label';
-                        pageLabel.textContent = `Page ${pageNum}`;
-                        
-                        pageContainer.appendChild(canvas);
-                        pageContainer.appendChild(pageLabel);
-                        pdfPagesContainer.appendChild(pageContainer);
-                        
-                        const renderContext = {
-                            canvasContext: context,
-                            viewport: viewport
-                        };
-                        await page.render(renderContext).promise;
-                        
-                        // Get text content for word position mapping
-                        try {
-                            const textContent = await page.getTextContent();
-                            pdfPages.push({
-                                pageNum: pageNum,
-                                textContent: textContent,
-                                viewport: viewport,
-                                scale: scale
-                            });
-                        } catch (textErr) {
-                            console.warn(`Could not get text for page ${pageNum}:`, textErr);
-                            // Continue without text content for this page
-                        }
-                    } catch (pageErr) {
-                        console.error(`Error rendering page ${pageNum}:`, pageErr);
-                        // Continue with next page
-                    }
-                }
-                
-                console.log('PDF rendering complete');
-                
-                // Initial highlight
-                highlightCurrentWord();
-                
-            } catch (error) {
-                console.error('Error rendering PDF preview:', error);
-                // Don't show alert, just log - app should continue working
-            }
-        }
-
-        function highlightCurrentWord() {
-            if (!pdfDoc || words.length === 0 || pdfPages.length === 0) {
-                console.log('Highlight skipped - not ready');
-                return;
-            }
-            
-            try {
-                // Remove existing highlights
-                document.querySelectorAll('.word-highlight-overlay').forEach(el => el.remove());
-                
-                let wordCount = 0;
-                let found = false;
-                
-                // Search through pages to find current word position
-                for (let pageData of pdfPages) {
-                    if (found) break;
-                    
-                    const textItems = pageData.textContent.items;
-                    
-                    for (let item of textItems) {
-                        if (!item.str || item.str.trim().length === 0) continue;
-                        
-                        const itemWords = item.str.trim().split(/\s+/).filter(w => w.length > 0);
-                        
-                        for (let i = 0; i < itemWords.length; i++) {
-                            if (wordCount === currentIndex) {
-                                // Found the current word, highlight it
-                                const pageContainer = document.getElementById(`pdf-page-${pageData.pageNum}`);
-                                if (!pageContainer) continue;
-                                
-                                const highlight = document.createElement('div');
-                                highlight.className = 'word-highlight-overlay';
-                                
-                                // Calculate position using transform matrix
-                                const tx = item.transform[4] * pageData.scale;
-                                const ty = pageData.viewport.height - (item.transform[5] * pageData.scale);
-                                const height = item.height * pageData.scale;
-                                const totalWidth = item.width * pageData.scale;
-                                const wordWidth = totalWidth / itemWords.length;
-                                const left = tx + (wordWidth * i);
-                                
-                                highlight.style.left = left + 'px';
-                                highlight.style.top = (ty - height) + 'px';
-                                highlight.style.width = wordWidth + 'px';
-                                highlight.style.height = height + 'px';
-                                
-                                pageContainer.appendChild(highlight);
-                                
-                                // Scroll to current page
-                                pageContainer.scrollIntoView({behavior: 'smooth', block: 'center'});
-                                
-                                found = true;
-                                break;
-                            }
-                            wordCount++;
-                        }
-                        
-                        if (found) break;
-                    }
-                }
-                
-                if (!found) {
-                    console.log('Word position not found in PDF');
-                }
-            } catch (error) {
-                console.error('Error highlighting word:', error);
-            }
-        }
+@app.route('/')
+def index():
+    # Revalidated on every load so new asset URLs are picked up
+    return precompressed_response(index_page, 'no-cache')
+
+@app.route('/assets/<path:name>')
+def asset(name):
+    body = assets.get(name)
+    if body is None:
+        return jsonify({'error': 'Unknown asset'}), 404
+    return precompressed_response(body, ASSET_CACHE_CONTROL)
+
+def document_meta(result):
+    # Outline and, for a page range, which pages the words come from
+    meta = {}
+    if result.get('outline'):
+        meta['outline'] = result['outline']
+    if 'page_numbers' in result:
+        meta['pageNumbers'] = result['page_numbers']
+        meta['pagesTotal'] = result['pages_total']
+    return meta
+
+def upload_payload(result, digest):
+    words = result['words']
+    
+    # Session format: only metadata, words are fetched in windows from /doc/<id>/words
+    if request.args.get('format') == 'session':
+        return session_payload(result, digest)
+    
+    # Compact format: sentence break indices instead of a second copy of the text
+    if request.args.get('format') == 'compact':
+        response = {'words': words, 'sentenceBreaks': result['sentence_breaks'], 'stats': result['stats'], 'sha256': digest}
+    else:
+        response = {'words': words, 'originalText': ' '.join(words), 'stats': result['stats'], 'sha256': digest}
+    
+    # Per-word dwell times and ORP offsets, only when asked for; the word pack
+    # and stream records already carry them packed
+    if request.args.get('annotate'):
+        response['dwell'] = result['dwell']
+        response['orp'] = result['orp']
+    
+    # Word bounding boxes for the preview highlight, only when asked for
+    if request.args.get('positions') and 'positions' in result:
+        response['pageOffsets'] = result['page_offsets']
+        response['positions'] = result['positions']
+    
+    response.update(document_meta(result))
+    return response
+
+def session_payload(result, digest):
+    dwell = result['dwell']
+    payload = {
+        'id': digest,
+        'totalWords': len(result['words']),
+        'pageOffsets': result['page_offsets'],
+        'meanDwell': sum(dwell) / len(dwell) if dwell else 10,
+        'stats': result['stats'],
+        'sha256': digest,
+    }
+    payload.update(document_meta(result))
+    return payload
+
+def wants_word_pack():
+    # Binary words when asked for by Accept header or ?format=binary; JSON otherwise
+    if request.args.get('format') == 'binary':
+        return True
+    best = request.accept_mimetypes.best_match(['application/json', wordpack.MIMETYPE])
+    return best == wordpack.MIMETYPE
+
+def word_pack_response(words, dwell, orp, sentence_breaks, positions, meta):
+    # positions is the raw Float32 quad buffer, or None
+    body = wordpack.encode_words(words, dwell, orp, sentence_breaks, positions, meta)
+    response = Response(body, mimetype=wordpack.MIMETYPE)
+    response.vary.add('Accept')
+    return response
+
+def upload_response(result, digest):
+    if request.args.get('format') != 'session' and wants_word_pack():
+        meta = {'stats': result['stats'], 'sha256': digest}
+        meta.update(document_meta(result))
+        positions = None
+        if request.args.get('positions') and 'positions' in result:
+            meta['pageOffsets'] = result['page_offsets']
+            positions = base64.b64decode(result['positions'])
+        return word_pack_response(
+            result['words'], result['dwell'], result['orp'], result['sentence_breaks'], positions, meta)
+    
+    response = jsonify(upload_payload(result, digest))
+    response.vary.add('Accept')
+    return response
 
-        // Dark mode toggle
-        const themeToggle = document.getElementById('themeToggle');
-        const htmlElement = document.documentElement;
-        const logoImage = document.getElementById('logoImage');
-        const savedTheme = localStorage.getItem('theme') || 'light';
-        
-        function updateLogo(theme) {
-            if (theme === 'dark') {
-                logoImage.src = '/static/speedread_logo_dark.png';
-            } else {
-                logoImage.src = '/static/speedread_logo.png';
-            }
-        }
+@app.route('/upload', methods=['POST'])
+def upload():
+    with stage('read_body'):
+        file = request.files.get('pdf')
+        uploaded = UploadedFile(file) if file else None
+    if uploaded is None:
+        return jsonify({'error': 'No file uploaded'}), 400
+    
+    # Set once the open document cache has taken over the upload
+    kept = False
+    try:
+        with stage('hash'):
+            digest = hashlib.sha256(uploaded.data).hexdigest()
         
-        if (savedTheme === 'dark') {
-            htmlElement.setAttribute('data-theme', 'dark');
-            themeToggle.textContent = '☀️ Light Mode';
-            updateLogo('dark');
-        }
+        result = cached_extraction(digest)
+        spec = request.args.get('pages')
+        if spec:
+            # Only the requested pages are extracted; the parsed document is
+            # kept open for the ranges that follow
+            if result is None and open_documents.get(digest) is None:
+                with stage('parse'):
+                    source = open_document(uploaded.data, uploaded.filename, uploaded.mimetype, MAX_PAGES)
+                open_documents.put(digest, uploaded, source)
+                kept = True
+            result = page_range_result(digest, spec, result)
+            if result is None:
+                return jsonify({'error': 'Document was closed, please retry'}), 503, {'Retry-After': '1'}
+        elif result is None:
+            timings = {}
+            with stage('extract_total'):
+                result = extract_document(uploaded.data, uploaded.filename, uploaded.mimetype, timings, MAX_PAGES)
+            record_timings(timings)
+            record_document(result, uploaded.size)
+            extraction_cache.put(digest, result)
         
-        themeToggle.addEventListener('click', () => {
-            const currentTheme = htmlElement.getAttribute('data-theme');
-            const newTheme = currentTheme === 'dark' ? 'light' : 'dark';
-            htmlElement.setAttribute('data-theme', newTheme);
-            localStorage.setItem('theme', newTheme);
-            themeToggle.textContent = newTheme === 'dark' ? '☀️ Light Mode' : '🌙 Dark Mode';
-            updateLogo(newTheme);
-        });
-    </script>
+        with stage('serialize'):
+            return upload_response(result, digest)
     
-        </div>
-        
-        <!-- PDF Preview Sidebar -->
-        <div class="pdf-sidebar" id="pdfSidebar">
-            <h3>PDF Preview</h3>
-            <div id="pdfPagesContainer"></div>
-        </div>
+    except Exception as e:
+        return error_response(e)
+    finally:
+        if not kept:
+            uploaded.close()
+
+def page_range_result(digest, spec, cached=None):
+    # The pages in spec, sliced from the full extraction when there is one,
+    # otherwise extracted from the open document; None if neither exists
+    if cached is not None:
+        source = CachedDocument(cached)
+        return extract_pages(source, parse_page_ranges(spec, source.pages_total))
+    entry = open_documents.get(digest)
+    if entry is None:
+        return None
+    pages = parse_page_ranges(spec, entry.source.pages_total)
+    timings = {}
+    with stage('extract_pages'):
+        result = entry.extract(pages, timings)
+    record_timings(timings)
+    return result
+
+def open_document_info(digest, entry):
+    return {
+        'id': digest,
+        'sha256': digest,
+        'format': entry.source.format,
+        'pagesTotal': entry.source.pages_total,
+        'outline': entry.source.outline(),
+        'expiresIn': open_documents.ttl,
+    }
+
+@app.route('/doc/open', methods=['POST'])
+def open_doc():
+    # Parse without extracting; pages are then read with /doc/<id>/pages
+    if 'pdf' not in request.files:
+        return jsonify({'error': 'No file uploaded'}), 400
     
-    </div>
-</body>
-</html>
-'''
-
-@app.route('/')
-def index():
-    return render_template_string(HTML_TEMPLATE)
+    uploaded = UploadedFile(request.files['pdf'])
+    digest = hashlib.sha256(uploaded.data).hexdigest()
+    entry = open_documents.get(digest)
+    if entry is not None:
+        uploaded.close()
+    else:
+        try:
+            with stage('parse'):
+                source = open_document(uploaded.data, uploaded.filename, uploaded.mimetype, MAX_PAGES)
+        except Exception as e:
+            uploaded.close()
+            return error_response(e)
+        entry = open_documents.put(digest, uploaded, source)
+    
+    return jsonify(open_document_info(digest, entry))
+
+@app.route('/doc/<doc_id>/pages')
+def document_pages(doc_id):
+    digest = doc_id.lower()
+    spec = request.args.get('pages')
+    if not spec:
+        return jsonify({'error': 'pages is required, e.g. pages=1-5'}), 400
+    try:
+        result = page_range_result(digest, spec, cached_extraction(digest))
+    except Exception as e:
+        return error_response(e)
+    if result is None:
+        # Open documents are per process and short-lived; upload again with ?pages=
+        return jsonify({'error': 'Document is not open'}), 404
+    
+    with stage('serialize'):
+        return upload_response(result, digest)
+
+@app.route('/upload/hash', methods=['POST'])
+def upload_hash():
+    # Lets a client skip sending the file when it is already cached
+    body = request.get_json(silent=True) or request.form
+    digest = (body.get('sha256') or '').lower()
+    if not re.fullmatch(r'[0-9a-f]{64}', digest):
+        return jsonify({'error': 'Invalid sha256'}), 400
+    
+    result = cached_extraction(digest)
+    if result is None:
+        return jsonify({'error': 'Not cached', 'sha256': digest}), 404
+    
+    with stage('serialize'):
+        return upload_response(result, digest)
 
-@app.route('/upload', methods=['POST'])
-def upload():
+@app.route('/upload/stream', methods=['POST'])
+def upload_stream():
     if 'pdf' not in request.files:
         return jsonify({'error': 'No file uploaded'}), 400
     
-    file = request.files['pdf']
+    uploaded = UploadedFile(request.files['pdf'])
+    digest = hashlib.sha256(uploaded.data).hexdigest()
+    cached = cached_extraction(digest)
+    spec = request.args.get('pages')
+    timings = {}
+    
+    # A page range is read through the open document cache, which then owns
+    # the upload, so /doc/<id>/pages can read further ranges without it
+    entry = open_documents.get(digest) if spec and cached is None else None
+    if cached is not None:
+        uploaded.close()
+        source = CachedDocument(cached)
+    elif entry is not None:
+        uploaded.close()
+        source = entry.source
+    else:
+        try:
+            with stage('parse'):
+                source = open_document(uploaded.data, uploaded.filename, uploaded.mimetype, MAX_PAGES)
+        except Exception as e:
+            uploaded.close()
+            return error_response(e)
+        if spec:
+            entry = open_documents.put(digest, uploaded, source)
+            source = entry.source
     
     try:
-        # Read PDF
-        pdf_reader = PyPDF2.PdfReader(io.BytesIO(file.read()))
+        selected = parse_page_ranges(spec, source.pages_total) if spec else None
+    except PageRangeError as e:
+        if entry is None:
+            uploaded.close()
+        return error_response(e)
+    if entry is not None:
+        pages = entry.iter_pages(selected, timings)
+    else:
+        pages = source.iter_pages(timings, selected)
+    include_positions = bool(request.args.get('positions'))
+    
+    def generate():
+        document = DocumentBuilder(source.outline())
+        try:
+            for page_num, page_words, char_offset, boxes in pages:
+                document.add_page(page_words, char_offset, boxes)
+                record = {
+                    'page': page_num,
+                    'words': page_words,
+                    'char_offset': char_offset,
+                    'dwell': document.dwell[-len(page_words):] if page_words else [],
+                    'orp': document.orp[-len(page_words):] if page_words else [],
+                }
+                if include_positions:
+                    record['positions'] = encode_boxes(boxes)
+                yield json.dumps(record) + '\n'
+        except DocumentClosed as e:
+            yield json.dumps({'error': str(e)}) + '\n'
+            return
+        except Exception as e:
+            record_error(e)
+            yield json.dumps({'error': str(e)}) + '\n'
+            return
+        finally:
+            if entry is None:
+                uploaded.close()
+            else:
+                # Releases the open document if the client went away mid-stream
+                pages.close()
         
-        # Extract text from all pages
-        text = ''
-        for page in pdf_reader.pages:
-            text += page.extract_text() + ' '
+        result = document.result()
+        # A page range is never cached as if it were the whole document
+        if cached is None and selected is None:
+            record_timings(timings)
+            record_document(result, uploaded.size)
+            extraction_cache.put(digest, result)
         
-        # Split into words (remove extra whitespace and split)
-        words = re.findall(r'\S+', text)
+        # Trailing summary record
+        summary = {
+            'done': True,
+            'pages': len(result['page_offsets']),
+            'total_words': len(result['words']),
+            'sentences': document.sentence_count(),
+            'stats': result['stats'],
+            'sha256': digest,
+        }
+        if result.get('outline'):
+            summary['outline'] = result['outline']
+        if selected is not None:
+            summary['pagesTotal'] = source.pages_total
+        yield json.dumps(summary) + '\n'
+    
+    # One JSON record per line, flushed as each page is extracted
+    return Response(generate(), mimetype='application/x-ndjson', headers={'X-Accel-Buffering': 'no'})
+
+def extract_batch_file(uploaded, digest):
+    # Runs on batch_pool; returns (result, cached) or raises like extract_document
+    try:
+        result = cached_extraction(digest)
+        if result is not None:
+            return result, True
+        timings = {}
+        result = extract_document(uploaded.data, uploaded.filename, uploaded.mimetype, timings, MAX_PAGES)
+        record_timings(timings)
+        record_document(result, uploaded.size)
+        extraction_cache.put(digest, result)
+        return result, False
+    finally:
+        uploaded.close()
+
+@app.route('/upload/batch', methods=['POST'])
+def upload_batch():
+    files = [file for file in request.files.getlist('pdf') if file]
+    if not files:
+        return jsonify({'error': 'No file uploaded'}), 400
+    if len(files) > MAX_BATCH_FILES:
+        return jsonify({'error': 'At most %d files per batch' % MAX_BATCH_FILES}), 413
+    
+    # Identical files in one batch are extracted once
+    with stage('hash'):
+        entries = {}
+        for index, file in enumerate(files):
+            uploaded = UploadedFile(file)
+            digest = hashlib.sha256(uploaded.data).hexdigest()
+            if digest in entries:
+                uploaded.close()
+                entries[digest][1].append((index, uploaded.filename))
+            else:
+                entries[digest] = (uploaded, [(index, uploaded.filename)])
+    
+    futures = {
+        batch_pool.submit(extract_batch_file, uploaded, digest): (digest, names)
+        for digest, (uploaded, names) in entries.items()
+    }
+    
+    def generate():
+        failed = 0
+        pending = set(futures)
+        try:
+            while pending:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    digest, names = futures[future]
+                    try:
+                        result, cached = future.result()
+                    except Exception as e:
+                        # Only this file fails; the rest of the batch carries on
+                        status = error_status(e)
+                        failed += len(names)
+                        outcome = {'sha256': digest, 'error': str(e), 'status': status}
+                    else:
+                        outcome = session_payload(result, digest)
+                        outcome['cached'] = cached
+                    for index, filename in names:
+                        record = {'index': index, 'filename': filename}
+                        record.update(outcome)
+                        yield json.dumps(record) + '\n'
+        finally:
+            # Client went away: files not yet started are dropped and closed
+            for future in pending:
+                if future.cancel():
+                    uploaded, _ = entries[futures[future][0]]
+                    uploaded.close()
         
-        return jsonify({'words': words, 'originalText': text})
+        yield json.dumps({'done': True, 'files': len(files), 'failed': failed}) + '\n'
+    
+    # One JSON record per file, in the order the files finish
+    return Response(generate(), mimetype='application/x-ndjson', headers={'X-Accel-Buffering': 'no'})
+
+@app.route('/doc/<doc_id>/words')
+def document_words(doc_id):
+    # Served from the packed windows, so a long book isn't parsed per request
+    windows = extraction_cache.windows(doc_id.lower(), cached_extraction)
+    if windows is None:
+        return jsonify({'error': 'Unknown document'}), 404
+    
+    total = windows.total
+    try:
+        start = int(request.args.get('start', 0))
+        count = int(request.args.get('count', 1000))
+    except ValueError:
+        return jsonify({'error': 'start and count must be integers'}), 400
+    start = max(0, min(start, total))
+    end = min(total, start + max(0, min(count, MAX_WORD_WINDOW)))
+    
+    words, dwell, orp, positions = windows.window(start, end)
+    if not request.args.get('positions'):
+        positions = None
+    
+    if wants_word_pack():
+        return word_pack_response(words, dwell, orp, (), positions, {'start': start, 'totalWords': total})
+    window = {'start': start, 'totalWords': total, 'words': words, 'dwell': dwell, 'orp': orp}
+    if positions is not None:
+        window['positions'] = base64.b64encode(positions).decode('ascii')
+    response = jsonify(window)
+    response.vary.add('Accept')
+    return response
+
+def client_token():
+    token = request.cookies.get(CLIENT_COOKIE, '')
+    return token if re.fullmatch(r'[0-9a-f]{32}', token) else None
+
+def session_response(session, result, status=200):
+    info = dict(session)
+    info['document'] = session_payload(result, session['sha256'])
+    return jsonify(info), status
+
+@app.route('/session', methods=['POST'])
+def create_session():
+    body = request.get_json(silent=True) or {}
+    digest = str(body.get('sha256') or '').lower()
+    if not re.fullmatch(r'[0-9a-f]{64}', digest):
+        return jsonify({'error': 'Invalid sha256'}), 400
+    
+    result = cached_extraction(digest)
+    if result is None:
+        return jsonify({'error': 'Unknown document'}), 404
+    session_store.put_document(digest, result)
     
+    client = client_token() or uuid.uuid4().hex
+    title = body.get('title')
+    session = session_store.open(client, digest, str(title)[:200] if title else None)
+    response, status = session_response(session, result)
+    if client != request.cookies.get(CLIENT_COOKIE):
+        response.set_cookie(CLIENT_COOKIE, client, max_age=CLIENT_COOKIE_MAX_AGE,
+                            httponly=True, samesite='Lax', secure=request.is_secure)
+    return response, status
+
+@app.route('/session/<session_id>')
+def get_session(session_id):
+    # Restores a session from the store alone; the PDF isn't needed again
+    client = client_token()
+    session = session_store.get(client, session_id) if client else None
+    if session is None:
+        return jsonify({'error': 'Unknown session'}), 404
+    result = cached_extraction(session['sha256'])
+    if result is None:
+        return jsonify({'error': 'Document is no longer stored'}), 410
+    return session_response(session, result)
+
+@app.route('/session/<session_id>', methods=['POST'])
+def update_session(session_id):
+    # POST rather than PUT so navigator.sendBeacon can save on page close
+    client = client_token()
+    body = request.get_json(silent=True, force=True) or {}
+    values = {}
+    for field in ('position', 'wpm', 'color'):
+        value = body.get(field)
+        if value is None:
+            continue
+        # bool is an int subclass, so true would otherwise be saved as 1
+        if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+            return jsonify({'error': '%s must be a non-negative integer' % field}), 400
+        values[field] = value
+    if not client or not session_store.update(client, session_id, **values):
+        return jsonify({'error': 'Unknown session'}), 404
+    return '', 204
+
+@app.route('/sessions')
+def list_sessions():
+    client = client_token()
+    return jsonify({'sessions': session_store.recent(client) if client else []})
+
+def run_extraction_job(job, payload):
+    # The upload was parsed when the job was submitted to check its page count
+    uploaded, source = payload
+    timings = {}
+    try:
+        job.pages_total = source.pages_total
+        
+        document = DocumentBuilder(source.outline())
+        for page_num, page_words, char_offset, boxes in source.iter_pages(timings):
+            document.add_page(page_words, char_offset, boxes)
+            job.progress(page_num)
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        record_error(e)
+        raise
+    finally:
+        uploaded.close()
+    
+    result = document.result()
+    record_timings(timings)
+    record_document(result, uploaded.size)
+    extraction_cache.put(job.digest, result)
+
+def discard_extraction_job(payload):
+    # A job that timed out in the queue still holds its mapped upload
+    uploaded, _ = payload
+    uploaded.close()
+
+# Extraction runs on these threads instead of in the request that submitted it
+extraction_jobs = JobQueue(
+    run_extraction_job,
+    discard=discard_extraction_job,
+    workers=int(os.environ.get('SPEEDREAD_JOB_WORKERS', 2)),
+    max_pending=int(os.environ.get('SPEEDREAD_JOB_QUEUE', 16)),
+    timeout=float(os.environ.get('SPEEDREAD_JOB_TIMEOUT', 120)),
+    ttl=float(os.environ.get('SPEEDREAD_JOB_TTL', 600)),
+)
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    if 'pdf' not in request.files:
+        return jsonify({'error': 'No file uploaded'}), 400
+    
+    uploaded = UploadedFile(request.files['pdf'])
+    digest = hashlib.sha256(uploaded.data).hexdigest()
+    
+    cached = cached_extraction(digest)
+    if cached is not None:
+        uploaded.close()
+        job = extraction_jobs.complete(digest)
+    else:
+        try:
+            with stage('parse'):
+                source = open_document(uploaded.data, uploaded.filename, uploaded.mimetype, MAX_PAGES)
+            job = extraction_jobs.submit(digest, (uploaded, source))
+        except QueueFull as e:
+            uploaded.close()
+            return jsonify({'error': str(e)}), 503, {'Retry-After': '5'}
+        except Exception as e:
+            uploaded.close()
+            return error_response(e)
+    
+    return jsonify(job.to_dict()), 202, {'Location': '/jobs/' + job.id}
+
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    job = extraction_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    
+    info = job.to_dict()
+    if job.status == 'done':
+        # Jobs only keep the digest; the result lives in the extraction cache,
+        # under its byte budget, and may have been evicted since
+        result = cached_extraction(job.digest)
+        if result is None:
+            return jsonify({'error': 'Result is no longer stored, please upload again'}), 410
+        info['result'] = upload_payload(result, job.digest)
+    return jsonify(info)
 
 if __name__ == '__main__':
     app.run(debug=False, host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
\ No newline at end of file
@@ -0,0 +1,127 @@
+// Network and parsing work for the reader, kept off the main thread so the
+// word ticks never wait behind it. Each request carries an id; replies are
+// {id, type: 'progress' | 'done' | 'error'}. Words travel as one string plus
+// transferable typed arrays (offsets, dwell, ORP, boxes), so the main thread
+// never parses JSON or base64 for them.
+importScripts(new URL(self.location).searchParams.get('wordpack'));
+
+self.onmessage = async (e) => {
+    const message = e.data;
+    try {
+        let result;
+        if (message.type === 'sha256') {
+            result = await sha256Hex(message.file);
+        } else if (message.type === 'stream') {
+            result = await streamUpload(message.id, message.file);
+        } else if (message.type === 'window') {
+            // Replies itself so it can transfer the response buffer
+            await fetchWindow(message.id, message.url);
+            return;
+        } else {
+            throw new Error('Unknown request ' + message.type);
+        }
+        self.postMessage({id: message.id, type: 'done', result: result});
+    } catch (error) {
+        self.postMessage({id: message.id, type: 'error', message: error.message});
+    }
+};
+
+async function sha256Hex(file) {
+    // crypto.subtle is only available on secure origins
+    if (!self.crypto || !self.crypto.subtle) return null;
+    const digest = await self.crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+    return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+}
+
+async function streamUpload(id, file) {
+    const formData = new FormData();
+    formData.append('pdf', file);
+    const response = await fetch('/upload/stream?positions=1', {
+        method: 'POST',
+        body: formData
+    });
+
+    if (!response.ok || !response.body) {
+        const data = await response.json();
+        throw new Error(data.error || response.statusText);
+    }
+
+    // Read one JSON record per line as pages are extracted
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffered = '';
+    let summary = null;
+
+    const handleLine = (line) => {
+        const record = JSON.parse(line);
+        if (record.error) {
+            throw new Error(record.error);
+        }
+        if (record.done) {
+            summary = record;
+        } else {
+            postPage(id, record);
+        }
+    };
+
+    while (true) {
+        const {value, done} = await reader.read();
+        if (done) break;
+        buffered += decoder.decode(value, {stream: true});
+        let newline;
+        while ((newline = buffered.indexOf('\n')) >= 0) {
+            const line = buffered.slice(0, newline).trim();
+            buffered = buffered.slice(newline + 1);
+            if (line) handleLine(line);
+        }
+    }
+    if (buffered.trim()) handleLine(buffered);
+    return summary;
+}
+
+function postPage(id, record) {
+    const words = record.words;
+    // Same layout as a word pack: newline separated, offsets of word starts
+    const offsets = new Uint32Array(words.length + 1);
+    for (let i = 0; i < words.length; i++) {
+        offsets[i + 1] = offsets[i] + words[i].length + 1;
+    }
+    const page = {
+        page: record.page,
+        count: words.length,
+        text: words.join('\n'),
+        offsets: offsets,
+        dwell: Uint8Array.from(record.dwell),
+        orp: Uint16Array.from(record.orp),
+        positions: record.positions ? decodeBoxes(record.positions) : null
+    };
+    const transfer = [offsets.buffer, page.dwell.buffer, page.orp.buffer];
+    if (page.positions) transfer.push(page.positions.buffer);
+    self.postMessage({id: id, type: 'progress', result: page}, transfer);
+}
+
+function decodeBoxes(encoded) {
+    const binary = atob(encoded);
+    const bytes = new Uint8Array(binary.length);
+    for (let i = 0; i < binary.length; i++) {
+        bytes[i] = binary.charCodeAt(i);
+    }
+    return new Float32Array(bytes.buffer);
+}
+
+async function fetchWindow(id, url) {
+    const response = await fetch(url, {headers: {'Accept': WORD_PACK_MIMETYPE}});
+    if (!response.ok) throw new Error('Could not load words: ' + response.status);
+    const buffer = await response.arrayBuffer();
+    const pack = unpackWordPack(buffer);
+    // The other views share the response buffer, so one transfer moves them all
+    self.postMessage({id: id, type: 'done', result: {
+        start: pack.meta.start,
+        count: pack.count,
+        text: pack.text,
+        offsets: pack.offsets,
+        dwell: pack.dwell,
+        orp: pack.orp,
+        positions: pack.positions
+    }}, [buffer, pack.offsets.buffer]);
+}
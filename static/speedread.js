@@ -0,0 +1,932 @@
+// Check if PDF.js loaded
+if (typeof pdfjsLib !== 'undefined') {
+    pdfjsLib.GlobalWorkerOptions.workerSrc = 'https://cdnjs.cloudflare.com/ajax/libs/pdf.js/3.11.174/pdf.worker.min.js';
+    console.log('PDF.js loaded successfully');
+} else {
+    console.error('PDF.js failed to load');
+}
+
+let currentIndex = 0;
+let isPlaying = false;
+let frameId = null;
+let nextDeadline = 0;
+let playStartTime = 0;
+let playStartIndex = 0;
+let lastRateUpdate = 0;
+let wpm = 300;
+let currentColorIndex = 0;
+const colorNames = ['red', 'orange', 'yellow', 'green', 'blue'];
+const colors = {
+    red: 'var(--color-red)',
+    orange: 'var(--color-orange)',
+    yellow: 'var(--color-yellow)',
+    green: 'var(--color-green)',
+    blue: 'var(--color-blue)'
+};
+
+// Hashing, upload parsing and word windows run in reader-worker.js; the main
+// thread only receives packed pages and paints
+class ReaderWorker {
+    constructor(url) {
+        this.worker = new Worker(url);
+        this.pending = new Map();
+        this.nextId = 1;
+        this.worker.onmessage = (e) => this.receive(e.data);
+    }
+
+    request(message, onProgress) {
+        const id = this.nextId++;
+        return new Promise((resolve, reject) => {
+            this.pending.set(id, {resolve, reject, onProgress});
+            this.worker.postMessage(Object.assign({id: id}, message));
+        });
+    }
+
+    receive(data) {
+        const entry = this.pending.get(data.id);
+        if (!entry) return;
+        if (data.type === 'progress') {
+            try {
+                entry.onProgress(data.result);
+            } catch (error) {
+                console.error(error);
+            }
+            return;
+        }
+        this.pending.delete(data.id);
+        if (data.type === 'error') {
+            entry.reject(new Error(data.message));
+        } else {
+            entry.resolve(data.result);
+        }
+    }
+}
+
+const readerWorker = new ReaderWorker(
+    document.body.dataset.workerSrc + '?wordpack=' + encodeURIComponent(document.body.dataset.wordpackSrc));
+
+// Words are held in fixed-size chunks along with their dwell (tenths of
+// the base interval), ORP index and bounding box from the server. Once
+// the server holds the whole document (docId is set), chunks away from
+// the reading position are dropped and fetched again when needed.
+const CHUNK_SIZE = 2048;
+const MAX_CHUNKS = 6;
+// A window that fails to load is retried after 1s, 2s, 4s...; after this
+// many failures playback stops instead of waiting on it
+const WINDOW_RETRIES = 4;
+const WINDOW_RETRY_MS = 1000;
+
+class WordStore {
+    constructor() {
+        this.reset();
+    }
+
+    reset() {
+        this.chunks = new Map();
+        this.loading = new Map();
+        this.failures = new Map();
+        this.length = 0;
+        this.docId = null;
+        this.dwellTotal = 0;
+        this.dwellMean = 10;
+    }
+
+    open(docId, length, meanDwell) {
+        this.reset();
+        this.docId = docId;
+        this.length = length;
+        this.dwellMean = meanDwell || 10;
+    }
+
+    newChunk() {
+        const boxes = new Float32Array(CHUNK_SIZE * 4);
+        boxes.fill(NaN);
+        return {
+            words: [],
+            dwell: new Uint8Array(CHUNK_SIZE),
+            orp: new Uint16Array(CHUNK_SIZE),
+            boxes: boxes
+        };
+    }
+
+    append(page) {
+        // page is a packed page from the worker: text, offsets, dwell, orp, positions
+        const boxes = page.positions;
+        for (let i = 0; i < page.count; i++) {
+            const index = this.length++;
+            const chunkIndex = Math.floor(index / CHUNK_SIZE);
+            let chunk = this.chunks.get(chunkIndex);
+            if (!chunk) {
+                chunk = this.newChunk();
+                this.chunks.set(chunkIndex, chunk);
+            }
+            const local = index - chunkIndex * CHUNK_SIZE;
+            const ticks = page.dwell[i];
+            chunk.words[local] = wordAt(page.text, page.offsets, i);
+            chunk.dwell[local] = ticks;
+            chunk.orp[local] = page.orp[i];
+            if (boxes) chunk.boxes.set(boxes.subarray(i * 4, i * 4 + 4), local * 4);
+            this.dwellTotal += ticks;
+        }
+        if (this.length > 0) this.dwellMean = this.dwellTotal / this.length;
+    }
+
+    locate(index) {
+        const chunk = this.chunks.get(Math.floor(index / CHUNK_SIZE));
+        const local = index % CHUNK_SIZE;
+        if (!chunk || chunk.words[local] === undefined) return null;
+        return {chunk: chunk, local: local};
+    }
+
+    has(index) {
+        return this.locate(index) !== null;
+    }
+
+    ensure(index) {
+        const chunkIndex = Math.floor(index / CHUNK_SIZE);
+        // While streaming, words that haven't arrived can't be fetched yet
+        if (this.chunks.has(chunkIndex) || !this.docId || index >= this.length) {
+            return Promise.resolve();
+        }
+        if (this.loading.has(chunkIndex)) return this.loading.get(chunkIndex);
+        const failure = this.failures.get(chunkIndex);
+        // Nothing to do until the backoff is over; tick() asks every frame
+        if (failure && performance.now() < failure.retryAt) return Promise.resolve();
+
+        const docId = this.docId;
+        const start = chunkIndex * CHUNK_SIZE;
+        const url = `/doc/${docId}/words?start=${start}&count=${CHUNK_SIZE}&positions=1`;
+        const promise = readerWorker.request({type: 'window', url: url})
+            .then(window => {
+                if (this.docId !== docId) return;
+                const chunk = this.newChunk();
+                chunk.words = sliceWords(window.text, window.offsets, window.count);
+                chunk.dwell.set(window.dwell);
+                chunk.orp.set(window.orp);
+                if (window.positions) chunk.boxes.set(window.positions);
+                this.chunks.set(chunkIndex, chunk);
+                this.failures.delete(chunkIndex);
+            }, err => {
+                if (this.docId === docId) {
+                    const count = (this.failures.get(chunkIndex)?.count || 0) + 1;
+                    const delay = WINDOW_RETRY_MS * 2 ** (count - 1);
+                    this.failures.set(chunkIndex, {count: count, retryAt: performance.now() + delay, error: err});
+                }
+                throw err;
+            })
+            .finally(() => this.loading.delete(chunkIndex));
+        this.loading.set(chunkIndex, promise);
+        return promise;
+    }
+
+    failed(index) {
+        // The error once a window has used up its retries, otherwise null
+        const failure = this.failures.get(Math.floor(index / CHUNK_SIZE));
+        return failure && failure.count >= WINDOW_RETRIES ? failure.error : null;
+    }
+
+    retry() {
+        this.failures.clear();
+    }
+
+    prefetch(index) {
+        // Have the next chunk ready before playback reaches it
+        const ahead = Math.min(index + CHUNK_SIZE / 2, this.length - 1);
+        this.ensure(ahead).catch(err => console.error(err));
+        this.evict(index);
+    }
+
+    evict(index) {
+        if (!this.docId) return;
+        const current = Math.floor(index / CHUNK_SIZE);
+        while (this.chunks.size > MAX_CHUNKS) {
+            let farthest = null;
+            for (const key of this.chunks.keys()) {
+                if (farthest === null || Math.abs(key - current) > Math.abs(farthest - current)) {
+                    farthest = key;
+                }
+            }
+            this.chunks.delete(farthest);
+        }
+    }
+}
+
+const store = new WordStore();
+
+const pdfFile = document.getElementById('pdfFile');
+const wordDisplay = document.getElementById('wordDisplay');
+const playPauseBtn = document.getElementById('playPauseBtn');
+const wpmSlider = document.getElementById('wpmSlider');
+const wpmValue = document.getElementById('wpmValue');
+const positionSlider = document.getElementById('positionSlider');
+const currentWordSpan = document.getElementById('currentWord');
+const totalWordsSpan = document.getElementById('totalWords');
+const readerSection = document.getElementById('readerSection');
+const statsSection = document.getElementById('statsSection');
+const fontSizeSlider = document.getElementById('fontSizeSlider');
+const fontSizeValue = document.getElementById('fontSizeValue');
+const positionValue = document.getElementById('positionValue');
+const totalWordsLabel = document.getElementById('totalWordsLabel');
+const jumpInput = document.getElementById('jumpInput');
+const jumpBtn = document.getElementById('jumpBtn');
+const actualWpmSpan = document.getElementById('actualWpm');
+const chapterPicker = document.getElementById('chapterPicker');
+const chapterSelect = document.getElementById('chapterSelect');
+
+// PDF Preview variables
+let pdfDoc = null;
+let pdfPages = {};
+// Index of the first word on each page
+let pageStarts = [];
+let highlightOverlay = null;
+let highlightedPage = 0;
+// Only pages near the sidebar viewport are rendered, into a fixed pool of canvases
+const PREVIEW_SCALE = 0.5;
+const PREVIEW_CANVAS_POOL = 8;
+let previewObserver = null;
+let renderedPages = new Map();
+let visiblePages = new Set();
+const pdfSidebar = document.getElementById('pdfSidebar');
+const pdfPagesContainer = document.getElementById('pdfPagesContainer');
+
+// Color buttons
+const colorButtons = document.querySelectorAll('.color-btn');
+const savedColorIndex = localStorage.getItem('highlightColorIndex') || '0';
+currentColorIndex = parseInt(savedColorIndex);
+
+// Set active button on load
+colorButtons.forEach(btn => {
+    if (btn.dataset.color === savedColorIndex) {
+        btn.classList.add('active');
+    }
+});
+
+function selectColor(index) {
+    colorButtons.forEach(b => b.classList.toggle('active', parseInt(b.dataset.color) === index));
+    currentColorIndex = index;
+    localStorage.setItem('highlightColorIndex', currentColorIndex);
+    refreshOrpColor();
+    updateDisplay();
+}
+
+colorButtons.forEach(btn => {
+    btn.addEventListener('click', () => {
+        selectColor(parseInt(btn.dataset.color));
+        scheduleSave();
+    });
+});
+
+// Reading session: the server keeps the document plus position, speed and
+// color, so a returning reader continues without uploading the file again
+const SESSION_SAVE_DELAY = 3000;
+let sessionId = null;
+let saveTimer = null;
+let readerShown = false;
+
+function showReader() {
+    positionSlider.max = store.length - 1;
+    totalWordsSpan.textContent = store.length;
+    totalWordsLabel.textContent = store.length;
+    jumpInput.max = store.length;
+
+    // Start as soon as the first words land
+    if (!readerShown && store.length > 0) {
+        readerShown = true;
+        updateDisplay();
+        readerSection.classList.remove('hidden');
+        playPauseBtn.disabled = false;
+    }
+}
+
+function showOutline(outline) {
+    // PDF bookmarks; each option's value is the page the chapter starts on
+    chapterSelect.innerHTML = '';
+    const entries = (outline || []).filter(entry => entry.page <= pageStarts.length);
+    for (const entry of entries) {
+        const option = document.createElement('option');
+        option.value = entry.page;
+        option.textContent = '\u00a0\u00a0'.repeat(entry.level) + (entry.title || 'Page ' + entry.page);
+        chapterSelect.appendChild(option);
+    }
+    chapterPicker.classList.toggle('hidden', entries.length === 0);
+}
+
+async function openSession(sha256, title) {
+    const response = await fetch('/session', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({sha256: sha256, title: title})
+    });
+    if (!response.ok) return;
+    const session = await response.json();
+    // Jump to the saved place unless reading has already begun
+    const resume = currentIndex === 0 && !isPlaying;
+    applySession(session, resume);
+}
+
+function applySession(session, resume) {
+    sessionId = session.id;
+    localStorage.setItem('speedreadSession', session.id);
+    if (session.wpm) {
+        wpm = session.wpm;
+        wpmSlider.value = wpm;
+        wpmValue.textContent = wpm;
+    }
+    if (session.color !== null && colorNames[session.color]) {
+        selectColor(session.color);
+    }
+    if (resume && session.position > 0 && session.position < store.length) {
+        currentIndex = session.position;
+        positionValue.textContent = currentIndex + 1;
+        updateDisplay();
+    }
+}
+
+function sessionState() {
+    return JSON.stringify({position: currentIndex, wpm: wpm, color: currentColorIndex});
+}
+
+function saveSession() {
+    clearTimeout(saveTimer);
+    saveTimer = null;
+    if (!sessionId) return;
+    fetch(`/session/${sessionId}`, {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: sessionState(),
+        keepalive: true
+    }).catch(err => console.error('Could not save session:', err));
+}
+
+function scheduleSave() {
+    if (sessionId && !saveTimer) {
+        saveTimer = setTimeout(saveSession, SESSION_SAVE_DELAY);
+    }
+}
+
+window.addEventListener('pagehide', () => {
+    if (sessionId) {
+        navigator.sendBeacon(`/session/${sessionId}`, new Blob([sessionState()], {type: 'application/json'}));
+    }
+});
+
+async function resumeLastSession() {
+    const lastId = localStorage.getItem('speedreadSession');
+    if (!lastId) return;
+    const response = await fetch(`/session/${lastId}`);
+    if (!response.ok) {
+        localStorage.removeItem('speedreadSession');
+        return;
+    }
+    const session = await response.json();
+    // A file picked in the meantime wins
+    if (store.length > 0) return;
+
+    const doc = session.document;
+    store.open(doc.id, doc.totalWords, doc.meanDwell);
+    pageStarts = doc.pageOffsets;
+    applySession(session, true);
+    await store.ensure(currentIndex);
+    showReader();
+    showOutline(doc.outline);
+    if (doc.stats) {
+        displayStats(doc.stats);
+        statsSection.classList.remove('hidden');
+    }
+}
+
+pdfFile.addEventListener('change', async (e) => {
+    const file = e.target.files[0];
+    if (!file) return;
+
+    pause();
+    saveSession();
+    sessionId = null;
+    store.reset();
+    currentIndex = 0;
+    pageStarts = [];
+    readerShown = false;
+    showOutline([]);
+
+    try {
+        let stats = null;
+        let outline = null;
+
+        const handlePage = (page) => {
+            pageStarts.push(store.length);
+            store.append(page);
+            if (page.count > 0) showReader();
+        };
+
+        // Skip the upload entirely if the server already has this file
+        const digest = await readerWorker.request({type: 'sha256', file: file});
+        let cacheHit = false;
+        if (digest) {
+            const cachedResponse = await fetch('/upload/hash?format=session', {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({sha256: digest})
+            });
+            if (cachedResponse.ok) {
+                // Only metadata comes back; words are fetched in windows
+                const data = await cachedResponse.json();
+                store.open(data.id, data.totalWords, data.meanDwell);
+                pageStarts = data.pageOffsets;
+                await store.ensure(0);
+                showReader();
+                stats = data.stats;
+                outline = data.outline;
+                cacheHit = true;
+            }
+        }
+
+        if (!cacheHit) {
+            const summary = await readerWorker.request({type: 'stream', file: file}, handlePage);
+            if (summary) {
+                stats = summary.stats;
+                outline = summary.outline;
+                // The server now holds the document, so chunks can be dropped and refetched
+                store.docId = summary.sha256;
+            }
+        }
+
+        if (store.length > 0) {
+            if (store.docId) {
+                openSession(store.docId, file.name).catch(err => console.error('Could not open session:', err));
+            }
+
+            showOutline(outline);
+
+            // Statistics are computed by the server during extraction
+            if (stats) {
+                displayStats(stats);
+                statsSection.classList.remove('hidden');
+            }
+
+            // Render PDF preview (completely optional, non-blocking)
+            if (isPdf(file)) {
+                setTimeout(() => {
+                    if (typeof renderPDFPreview === 'function') {
+                        renderPDFPreview(file).catch(err => {
+                            console.error('PDF preview failed:', err);
+                        });
+                    }
+                }, 100);
+            } else {
+                clearPDFPreview();
+            }
+        } else {
+            alert('No text found in this file');
+        }
+    } catch (error) {
+        alert('Error processing file: ' + error.message);
+    }
+});
+
+playPauseBtn.addEventListener('click', () => {
+    if (isPlaying) {
+        pause();
+    } else {
+        play();
+    }
+});
+
+wpmSlider.addEventListener('input', (e) => {
+    wpm = parseInt(e.target.value);
+    wpmValue.textContent = wpm;
+    scheduleSave();
+    if (isPlaying) {
+        pause();
+        play();
+    }
+});
+
+fontSizeSlider.addEventListener('input', (e) => {
+    const fontSize = parseInt(e.target.value);
+    fontSizeValue.textContent = fontSize;
+    wordDisplay.style.fontSize = fontSize + 'px';
+});
+
+positionSlider.addEventListener('input', (e) => {
+    currentIndex = parseInt(e.target.value);
+    positionValue.textContent = currentIndex + 1;
+    updateDisplay();
+});
+
+jumpBtn.addEventListener('click', () => {
+    const jumpTo = parseInt(jumpInput.value);
+    if (jumpTo && jumpTo > 0 && jumpTo <= store.length) {
+        currentIndex = jumpTo - 1;
+        positionSlider.value = currentIndex;
+        positionValue.textContent = currentIndex + 1;
+        updateDisplay();
+        jumpInput.value = '';
+    } else {
+        alert('Please enter a valid word number between 1 and ' + store.length);
+    }
+});
+
+chapterSelect.addEventListener('change', () => {
+    const start = pageStarts[parseInt(chapterSelect.value) - 1];
+    if (start === undefined || start >= store.length) return;
+    currentIndex = start;
+    positionSlider.value = currentIndex;
+    positionValue.textContent = currentIndex + 1;
+    updateDisplay();
+});
+
+jumpInput.addEventListener('keypress', (e) => {
+    if (e.key === 'Enter') {
+        jumpBtn.click();
+    }
+});
+
+function wordDuration(index) {
+    // Scale dwell so the average pace still matches the slider
+    const location = store.locate(index);
+    const ticks = location ? location.chunk.dwell[location.local] : 10;
+    return (60000 / wpm) * (ticks / store.dwellMean);
+}
+
+function play() {
+    // Pressing Play again after a failed window tries it straight away
+    store.retry();
+    isPlaying = true;
+    playPauseBtn.textContent = 'Pause';
+    const now = performance.now();
+    playStartTime = now;
+    playStartIndex = currentIndex;
+    lastRateUpdate = now;
+    nextDeadline = now + wordDuration(currentIndex);
+    frameId = requestAnimationFrame(tick);
+}
+
+function tick(now) {
+    if (!isPlaying) return;
+
+    // Deadlines are absolute so frame jitter never accumulates into drift
+    if (now - nextDeadline > 1000) {
+        // Tab was throttled; resume from here instead of racing to catch up
+        nextDeadline = now;
+        playStartTime = now;
+        playStartIndex = currentIndex;
+    }
+
+    let advanced = false;
+    while (now >= nextDeadline) {
+        if (currentIndex >= store.length - 1) {
+            pause();
+            return;
+        }
+        if (!store.has(currentIndex + 1)) {
+            const error = store.failed(currentIndex + 1);
+            if (error) {
+                pause();
+                alert('Could not load the next words: ' + error.message);
+                return;
+            }
+            // Wait for the next window instead of skipping words
+            store.ensure(currentIndex + 1).catch(err => console.error(err));
+            nextDeadline = now;
+            break;
+        }
+        currentIndex++;
+        nextDeadline += wordDuration(currentIndex);
+        advanced = true;
+    }
+
+    if (advanced) {
+        updateDisplay();
+        if (now - lastRateUpdate > 500) {
+            const minutes = (now - playStartTime) / 60000;
+            actualWpmSpan.textContent = Math.round((currentIndex - playStartIndex) / minutes);
+            lastRateUpdate = now;
+        }
+    }
+    frameId = requestAnimationFrame(tick);
+}
+
+function pause() {
+    isPlaying = false;
+    playPauseBtn.textContent = 'Play';
+    if (frameId) {
+        cancelAnimationFrame(frameId);
+        frameId = null;
+    }
+    scheduleSave();
+}
+
+// Built once; each tick only swaps the text of these three nodes
+const wordContainer = document.createElement('div');
+wordContainer.className = 'word-container';
+const beforeNode = document.createElement('span');
+beforeNode.className = 'word-before';
+const orpNode = document.createElement('span');
+orpNode.className = 'orp';
+const afterNode = document.createElement('span');
+wordContainer.append(beforeNode, orpNode, afterNode);
+
+function refreshOrpColor() {
+    // Theme changes re-resolve the variable without any script work
+    orpNode.style.color = colors[colorNames[currentColorIndex]];
+}
+
+function updateDisplay() {
+    if (store.length > 0) {
+        const location = store.locate(currentIndex);
+        if (!location) {
+            store.ensure(currentIndex).then(() => {
+                if (store.has(currentIndex)) updateDisplay();
+            }).catch(err => console.error(err));
+            return;
+        }
+        const word = location.chunk.words[location.local];
+        const orpIndex = location.chunk.orp[location.local];
+
+        if (wordContainer.parentNode !== wordDisplay) {
+            wordDisplay.replaceChildren(wordContainer);
+        }
+
+        // textContent never parses markup from the PDF text
+        beforeNode.textContent = word.substring(0, orpIndex);
+        orpNode.textContent = word.charAt(orpIndex);
+        afterNode.textContent = word.substring(orpIndex + 1);
+
+        positionSlider.value = currentIndex;
+        currentWordSpan.textContent = currentIndex + 1;
+        store.prefetch(currentIndex);
+        scheduleSave();
+
+        // Update PDF highlight
+        highlightCurrentWord();
+    }
+}
+
+function displayStats(stats) {
+    document.getElementById('statTotalWords').textContent = stats.totalWords.toLocaleString();
+    document.getElementById('statUniqueWords').textContent = stats.uniqueWords.toLocaleString();
+    document.getElementById('statDiversity').textContent = stats.lexicalDiversity.toFixed(1) + '%';
+    document.getElementById('statAvgWordLen').textContent = stats.avgWordLength.toFixed(1);
+    document.getElementById('statAvgSentenceLen').textContent = stats.avgSentenceLength.toFixed(1);
+    document.getElementById('statReadingLevel').textContent = stats.readingLevel.toFixed(1);
+}
+
+// PDF Preview Functions
+function isPdf(file) {
+    return file.type === 'application/pdf' || /\.pdf$/i.test(file.name);
+}
+
+function clearPDFPreview() {
+    // Other formats have no page images to show
+    pdfDoc = null;
+    pdfPages = {};
+    highlightOverlay = null;
+    highlightedPage = 0;
+    renderedPages.forEach(entry => entry.task && entry.task.cancel());
+    renderedPages = new Map();
+    visiblePages = new Set();
+    if (previewObserver) previewObserver.disconnect();
+    document.getElementById('pdfPagesContainer').innerHTML = '';
+}
+
+async function renderPDFPreview(file) {
+    try {
+        console.log('Starting PDF preview render...');
+
+        // Check if PDF.js is available
+        if (typeof pdfjsLib === 'undefined') {
+            console.error('PDF.js library not loaded');
+            return;
+        }
+
+        const pdfSidebar = document.getElementById('pdfSidebar');
+        const pdfPagesContainer = document.getElementById('pdfPagesContainer');
+
+        if (!pdfSidebar || !pdfPagesContainer) {
+            console.error('PDF sidebar elements not found');
+            return;
+        }
+
+        const arrayBuffer = await file.arrayBuffer();
+        pdfDoc = await pdfjsLib.getDocument({data: arrayBuffer}).promise;
+        console.log('PDF loaded, pages:', pdfDoc.numPages);
+
+        pdfPagesContainer.innerHTML = '';
+        pdfPages = {};
+        highlightOverlay = null;
+        highlightedPage = 0;
+        renderedPages.forEach(entry => entry.task && entry.task.cancel());
+        renderedPages = new Map();
+        visiblePages = new Set();
+        if (previewObserver) previewObserver.disconnect();
+
+        // Size placeholders from the first page; each page corrects it when rendered
+        const firstPage = await pdfDoc.getPage(1);
+        const defaultViewport = firstPage.getViewport({scale: PREVIEW_SCALE});
+
+        previewObserver = new IntersectionObserver(onPreviewIntersect, {
+            root: pdfSidebar,
+            rootMargin: '100% 0px'
+        });
+
+        for (let pageNum = 1; pageNum <= pdfDoc.numPages; pageNum++) {
+            const pageContainer = document.createElement('div');
+            pageContainer.className = 'pdf-page-container';
+            pageContainer.id = `pdf-page-${pageNum}`;
+            pageContainer.dataset.pageNum = pageNum;
+            pageContainer.style.aspectRatio = `${defaultViewport.width} / ${defaultViewport.height}`;
+
+            const pageLabel = document.createElement('div');
+            pageLabel.className = 'pdf-page-label';
+            pageLabel.textContent = `Page ${pageNum}`;
+
+            pageContainer.appendChild(pageLabel);
+            pdfPagesContainer.appendChild(pageContainer);
+            previewObserver.observe(pageContainer);
+        }
+
+        // Show sidebar immediately
+        pdfSidebar.classList.add('active');
+
+        // Initial highlight
+        highlightCurrentWord();
+
+    } catch (error) {
+        console.error('Error rendering PDF preview:', error);
+        // Don't show alert, just log - app should continue working
+    }
+}
+
+function onPreviewIntersect(entries) {
+    for (const entry of entries) {
+        const pageNum = parseInt(entry.target.dataset.pageNum);
+        if (entry.isIntersecting) {
+            visiblePages.add(pageNum);
+            renderPreviewPage(pageNum).catch(err => {
+                console.error(`Error rendering page ${pageNum}:`, err);
+            });
+        } else {
+            visiblePages.delete(pageNum);
+        }
+    }
+}
+
+function acquireCanvas() {
+    if (renderedPages.size < PREVIEW_CANVAS_POOL) {
+        return document.createElement('canvas');
+    }
+
+    // Recycle the off-screen page farthest from the reading position
+    const readingPage = pageStarts.length > 0 ? findPageIndex(currentIndex) + 1 : 1;
+    let victim = null;
+    let victimScore = -1;
+    for (const pageNum of renderedPages.keys()) {
+        const score = Math.abs(pageNum - readingPage) + (visiblePages.has(pageNum) ? 0 : pdfDoc.numPages);
+        if (score > victimScore) {
+            victim = pageNum;
+            victimScore = score;
+        }
+    }
+
+    const entry = renderedPages.get(victim);
+    renderedPages.delete(victim);
+    if (entry.task) entry.task.cancel();
+    entry.canvas.remove();
+    return entry.canvas;
+}
+
+async function renderPreviewPage(pageNum) {
+    if (renderedPages.has(pageNum)) return;
+
+    const doc = pdfDoc;
+    const entry = {canvas: acquireCanvas(), task: null};
+    renderedPages.set(pageNum, entry);
+
+    const page = await doc.getPage(pageNum);
+    // The document changed or the canvas was recycled while loading
+    if (doc !== pdfDoc || renderedPages.get(pageNum) !== entry) return;
+
+    const viewport = page.getViewport({scale: PREVIEW_SCALE});
+    pdfPages[pageNum] = {
+        pageNum: pageNum,
+        viewport: viewport
+    };
+
+    const pageContainer = document.getElementById(`pdf-page-${pageNum}`);
+    pageContainer.style.aspectRatio = `${viewport.width} / ${viewport.height}`;
+
+    const canvas = entry.canvas;
+    canvas.height = viewport.height;
+    canvas.width = viewport.width;
+    pageContainer.insertBefore(canvas, pageContainer.firstChild);
+
+    if (highlightedPage === pageNum) {
+        highlightCurrentWord();
+    }
+
+    entry.task = page.render({
+        canvasContext: canvas.getContext('2d'),
+        viewport: viewport
+    });
+    try {
+        await entry.task.promise;
+    } catch (err) {
+        if (err && err.name === 'RenderingCancelledException') return;
+        throw err;
+    }
+    entry.task = null;
+}
+
+function findPageIndex(wordIndex) {
+    // Last page whose first word is at or before wordIndex
+    let lo = 0;
+    let hi = pageStarts.length - 1;
+    while (lo < hi) {
+        const mid = (lo + hi + 1) >> 1;
+        if (pageStarts[mid] <= wordIndex) {
+            lo = mid;
+        } else {
+            hi = mid - 1;
+        }
+    }
+    return lo;
+}
+
+function highlightCurrentWord() {
+    if (!pdfDoc || store.length === 0 || pageStarts.length === 0) {
+        return;
+    }
+
+    try {
+        const pageIndex = findPageIndex(currentIndex);
+        const location = store.locate(currentIndex);
+        const boxes = location ? location.chunk.boxes : null;
+        const pageData = pdfPages[pageIndex + 1];
+        const offset = location ? location.local * 4 : 0;
+        const pageContainer = document.getElementById(`pdf-page-${pageIndex + 1}`);
+
+        // Only scroll when reading moves onto another page; scrolling
+        // also brings the page into the render window
+        if (pageContainer && highlightedPage !== pageIndex + 1) {
+            highlightedPage = pageIndex + 1;
+            pageContainer.scrollIntoView({behavior: 'smooth', block: 'center'});
+        }
+
+        if (!boxes || !pageData || !pageContainer || offset + 3 >= boxes.length || isNaN(boxes[offset])) {
+            if (highlightOverlay) highlightOverlay.style.display = 'none';
+            return;
+        }
+
+        // Reuse a single overlay instead of rebuilding it every tick
+        if (!highlightOverlay) {
+            highlightOverlay = document.createElement('div');
+            highlightOverlay.className = 'word-highlight-overlay';
+        }
+        if (highlightOverlay.parentNode !== pageContainer) {
+            pageContainer.appendChild(highlightOverlay);
+        }
+
+        const x = boxes[offset];
+        const y = boxes[offset + 1];
+        const rect = pageData.viewport.convertToViewportRectangle([x, y, x + boxes[offset + 2], y + boxes[offset + 3]]);
+        highlightOverlay.style.display = '';
+        highlightOverlay.style.left = Math.min(rect[0], rect[2]) + 'px';
+        highlightOverlay.style.top = Math.min(rect[1], rect[3]) + 'px';
+        highlightOverlay.style.width = Math.abs(rect[2] - rect[0]) + 'px';
+        highlightOverlay.style.height = Math.abs(rect[3] - rect[1]) + 'px';
+    } catch (error) {
+        console.error('Error highlighting word:', error);
+    }
+}
+
+// Dark mode toggle
+const themeToggle = document.getElementById('themeToggle');
+const htmlElement = document.documentElement;
+const logoImage = document.getElementById('logoImage');
+const savedTheme = localStorage.getItem('theme') || 'light';
+
+function updateLogo(theme) {
+    if (theme === 'dark') {
+        logoImage.src = logoImage.dataset.darkSrc;
+    } else {
+        logoImage.src = logoImage.dataset.lightSrc;
+    }
+}
+
+if (savedTheme === 'dark') {
+    htmlElement.setAttribute('data-theme', 'dark');
+    themeToggle.textContent = '☀️ Light Mode';
+    updateLogo('dark');
+}
+refreshOrpColor();
+
+themeToggle.addEventListener('click', () => {
+    const currentTheme = htmlElement.getAttribute('data-theme');
+    const newTheme = currentTheme === 'dark' ? 'light' : 'dark';
+    htmlElement.setAttribute('data-theme', newTheme);
+    localStorage.setItem('theme', newTheme);
+    themeToggle.textContent = newTheme === 'dark' ? '☀️ Light Mode' : '🌙 Dark Mode';
+    updateLogo(newTheme);
+});
+
+resumeLastSession().catch(err => console.error('Could not resume session:', err));
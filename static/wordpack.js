@@ -0,0 +1,86 @@
+// Decoder for application/vnd.speedread.words responses; the layout is
+// documented in wordpack.py. Typed-array views assume a little-endian host,
+// which covers every browser in practice.
+const WORD_PACK_MAGIC = 0x32575253; // 'SRW2' read as a little-endian uint32
+const WORD_PACK_FLAG_POSITIONS = 1;
+const WORD_PACK_MIMETYPE = 'application/vnd.speedread.words';
+
+function alignWordPack(offset) {
+    return (offset + 3) & ~3;
+}
+
+function unpackWordPack(buffer) {
+    // Views over the buffer plus the decoded text; no per-word strings yet
+    const view = new DataView(buffer);
+    if (view.getUint32(0, true) !== WORD_PACK_MAGIC) {
+        throw new Error('Not a word pack');
+    }
+    const flags = view.getUint32(4, true);
+    const count = view.getUint32(8, true);
+    const breakCount = view.getUint32(12, true);
+    const metaLength = view.getUint32(16, true);
+    const textLength = view.getUint32(20, true);
+    const decoder = new TextDecoder();
+
+    let offset = 24;
+    const meta = JSON.parse(decoder.decode(new Uint8Array(buffer, offset, metaLength)));
+    offset = alignWordPack(offset + metaLength);
+
+    // Gaps between sentence breaks back to word indices
+    const sentenceBreaks = new Uint32Array(buffer, offset, breakCount).slice();
+    for (let i = 0, index = -1; i < breakCount; i++) {
+        index += sentenceBreaks[i];
+        sentenceBreaks[i] = index;
+    }
+    offset += breakCount * 4;
+    let positions = null;
+    if (flags & WORD_PACK_FLAG_POSITIONS) {
+        positions = new Float32Array(buffer, offset, count * 4);
+        offset += count * 16;
+    }
+    const orp = new Uint16Array(buffer, offset, count);
+    offset = alignWordPack(offset + count * 2);
+    const dwell = new Uint8Array(buffer, offset, count);
+    offset = alignWordPack(offset + count);
+
+    // One decode for the whole text. Words stay newline separated: offsets
+    // are where each word starts, in UTF-16 code units, and a word ends one
+    // before the next offset (see wordAt)
+    const text = decoder.decode(new Uint8Array(buffer, offset, textLength));
+    const offsets = new Uint32Array(count + 1);
+    let from = 0;
+    for (let i = 1; i < count; i++) {
+        from = text.indexOf('\n', from) + 1;
+        offsets[i] = from;
+    }
+    offsets[count] = text.length + 1;
+    return {meta, count, text, offsets, sentenceBreaks, positions, orp, dwell};
+}
+
+function wordAt(text, offsets, i) {
+    return text.slice(offsets[i], offsets[i + 1] - 1);
+}
+
+function sliceWords(text, offsets, count) {
+    const words = new Array(count);
+    for (let i = 0; i < count; i++) {
+        words[i] = text.slice(offsets[i], offsets[i + 1] - 1);
+    }
+    return words;
+}
+
+function decodeWordPack(buffer) {
+    const pack = unpackWordPack(buffer);
+    return {
+        meta: pack.meta,
+        words: sliceWords(pack.text, pack.offsets, pack.count),
+        sentenceBreaks: pack.sentenceBreaks,
+        positions: pack.positions,
+        orp: pack.orp,
+        dwell: pack.dwell
+    };
+}
+
+if (typeof module !== 'undefined') {
+    module.exports = {decodeWordPack, unpackWordPack, sliceWords, wordAt, WORD_PACK_MIMETYPE};
+}
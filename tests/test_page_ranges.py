@@ -0,0 +1,28 @@
+import pytest
+
+from extractors import PageRangeError, parse_page_ranges
+
+
+@pytest.mark.parametrize('spec, pages', [
+    ('1', [0]),
+    ('1-3', [0, 1, 2]),
+    ('2, 5-6', [1, 4, 5]),
+    ('3,1-2,2', [0, 1, 2]),
+    ('8-', [7, 8, 9]),
+    ('-2', [0, 1]),
+    ('9-20', [8, 9]),
+])
+def test_valid(spec, pages):
+    assert parse_page_ranges(spec, 10) == pages
+
+
+@pytest.mark.parametrize('spec', ['', '-', 'x', '1-2-3', '1,,2', '3-1', '0', '11', '11-12', '1.5'])
+def test_malformed_or_out_of_range(spec):
+    with pytest.raises(PageRangeError):
+        parse_page_ranges(spec, 10)
+
+
+@pytest.mark.parametrize('spec', [True, False])
+def test_boolean(spec):
+    with pytest.raises(PageRangeError):
+        parse_page_ranges(spec, 10)
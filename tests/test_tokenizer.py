@@ -0,0 +1,41 @@
+from tokenizer import RunningLines, drop_words, tokenize
+
+
+def words(text):
+    return tokenize(text)[0]
+
+
+def test_hyphen_joins_across_lines():
+    assert words('The infor-\nmation age') == ['The', 'information', 'age']
+    assert words('infor-\nma-\ntion') == ['information']
+
+
+def test_hyphen_kept_before_capital_or_paragraph_break():
+    assert words('well-\nKnown') == ['well-', 'Known']
+    assert words('end-\n\nnext') == ['end-', 'next']
+
+
+def test_joined_word_keeps_first_fragment_offsets():
+    _, spans, _ = tokenize('The infor-\nmation age', offsets=True)
+    assert list(spans) == [0, 3, 4, 10, 18, 21]
+
+
+def test_nfkc_ligatures_and_compatibility_forms():
+    assert words('the ﬁrst oﬃce') == ['the', 'first', 'office']
+    assert words('ＡＢ co­op') == ['AB', 'coop']
+
+
+def test_running_header_dropped_across_pages():
+    running_lines = RunningLines()
+    pages = []
+    for index, body in enumerate(['It was the best of times,', 'it was the worst of times,', 'it was the age of wisdom.']):
+        text = 'A Tale of Two Cities\n%s\nBook the First\n%d' % (body, index + 1)
+        page_words, _, edges = tokenize(text)
+        page_words, _ = drop_words(page_words, None, running_lines.drop(index, edges))
+        pages.append(' '.join(page_words))
+    # Repeated lines are kept where they first appear; page numbers never are
+    assert pages == [
+        'A Tale of Two Cities It was the best of times, Book the First',
+        'it was the worst of times,',
+        'it was the age of wisdom.',
+    ]
@@ -0,0 +1,44 @@
+from array import array
+
+import pytest
+
+import wordpack
+
+
+def test_round_trip():
+    words = ['Call', 'me', 'Ishmael.', 'Café', '—', 'years', 'ago.']
+    dwell = [10, 8, 20, 12, 4, 10, 18]
+    orp = [1, 0, 2, 1, 0, 1, 1]
+    positions = array('f', range(len(words) * 4)).tobytes()
+    meta = {'sha256': 'abc', 'stats': {'totalWords': 7}}
+    decoded = wordpack.decode_words(wordpack.encode_words(words, dwell, orp, [2, 6], positions, meta))
+    assert decoded['meta'] == meta
+    assert decoded['words'] == words
+    assert decoded['sentenceBreaks'] == [2, 6]
+    assert decoded['dwell'] == dwell
+    assert decoded['orp'] == orp
+    assert decoded['positions'].tobytes() == positions
+
+
+def test_round_trip_without_positions():
+    decoded = wordpack.decode_words(wordpack.encode_words(['a', '', 'b'], [1, 2, 3], [0, 0, 0], [0]))
+    assert decoded['words'] == ['a', '', 'b']
+    assert decoded['sentenceBreaks'] == [0]
+    assert decoded['positions'] is None
+    assert decoded['meta'] == {}
+
+
+def test_round_trip_empty():
+    decoded = wordpack.decode_words(wordpack.encode_words([], [], []))
+    assert decoded['words'] == []
+    assert decoded['sentenceBreaks'] == []
+
+
+def test_newline_in_word_rejected():
+    with pytest.raises(ValueError):
+        wordpack.encode_words(['two\nlines'], [1], [0])
+
+
+def test_not_a_word_pack():
+    with pytest.raises(ValueError):
+        wordpack.decode_words(b'\0' * wordpack.HEADER.size)
@@ -0,0 +1,64 @@
+import re
+from collections import Counter
+
+VOWEL_GROUP = re.compile(r'[aeiouy]+')
+
+
+class TextStats:
+    # Accumulates reading statistics page by page during extraction.
+    # Words are counted once per distinct lowercase form, so per-word work
+    # like syllable counting only runs over the vocabulary.
+
+    def __init__(self):
+        self._counts = Counter()
+
+    def update(self, words):
+        self._counts.update(word.lower() for word in words)
+
+    def summary(self, sentence_count):
+        total_words = sum(self._counts.values())
+        if total_words == 0:
+            return {
+                'totalWords': 0,
+                'uniqueWords': 0,
+                'lexicalDiversity': 0.0,
+                'avgWordLength': 0.0,
+                'avgSentenceLength': 0.0,
+                'readingLevel': 0.0,
+            }
+
+        total_chars = 0
+        syllables = 0
+        for word, count in self._counts.items():
+            total_chars += len(word) * count
+            syllables += count_syllables(word) * count
+
+        sentences = sentence_count or 1
+        words_per_sentence = total_words / sentences
+        # Flesch-Kincaid grade level
+        reading_level = 0.39 * words_per_sentence + 11.8 * (syllables / total_words) - 15.59
+
+        return {
+            'totalWords': total_words,
+            'uniqueWords': len(self._counts),
+            'lexicalDiversity': round(len(self._counts) / total_words * 100, 1),
+            'avgWordLength': round(total_chars / total_words, 1),
+            'avgSentenceLength': round(words_per_sentence, 1),
+            'readingLevel': max(0.0, round(reading_level, 1)),
+        }
+
+
+def compute_stats(words, sentence_count):
+    stats = TextStats()
+    stats.update(words)
+    return stats.summary(sentence_count)
+
+
+def count_syllables(word):
+    # Expects a lowercase word; counts vowel groups with the silent-e rules
+    count = len(VOWEL_GROUP.findall(word))
+    if word.endswith('e'):
+        count -= 1
+    if word.endswith('le') and len(word) > 2 and word[-3] not in 'aeiouy':
+        count += 1
+    return max(1, count)
@@ -0,0 +1,155 @@
+import re
+import unicodedata
+from array import array
+
+WORD = re.compile(r'\S+')
+# Characters that end a line-broken word fragment: hyphen-minus, soft hyphen, hyphen
+HYPHENS = frozenset('-\u00ad\u2010')
+# Applied before NFKC, which leaves these alone or maps them to something unreadable
+CHARACTERS = str.maketrans({
+    '\u00ad': '',    # soft hyphen
+    '\u200b': '',    # zero width space
+    '\u200c': '',    # zero width non-joiner
+    '\u200d': '',    # zero width joiner
+    '\u2060': '',    # word joiner
+    '\ufeff': '',    # byte order mark
+    '\u2010': '-',   # hyphen
+    '\u2011': '-',   # non-breaking hyphen
+    '\u2212': '-',   # minus sign
+})
+
+# Lines at the top and bottom of a page that may be running headers or footers
+EDGE_LINES = 2
+# Longer lines are body text, whatever repeats
+MAX_EDGE_WORDS = 12
+# A header seen on any of this many previous pages is dropped; more than one
+# covers books that alternate titles on left and right pages
+RUNNING_WINDOW = 3
+# "12", "page 12", "12 of 300", "- 12 -", and roman numerals up to xxxix
+PAGE_NUMBER = re.compile(
+    r'(?:page\s+)?\d{1,4}(?:\s*(?:of|/)\s*\d{1,4})?|(?=[ivx])x{0,3}(?:ix|iv|v?i{0,3})'
+    r'|[-\u2013\u2014]\s*\d{1,4}\s*[-\u2013\u2014]')
+DIGITS = re.compile(r'\d+')
+
+
+def normalize(word):
+    # Ligatures, full-width and other compatibility forms to plain letters
+    return unicodedata.normalize('NFKC', word.translate(CHARACTERS))
+
+
+def tokenize(text, offsets=False):
+    # One pass over extract_text() output, a line at a time. Returns the
+    # words, their (start, end) offsets in text as a flat array when asked
+    # for, and the page's edge lines as (lowercased text, first word, end
+    # word) for RunningLines. A word hyphenated across a line break is
+    # joined and keeps the first fragment's offsets.
+    words = []
+    spans = array('I') if offsets else None
+    line_words = []
+    line_chars = []
+    hyphenated = None
+    position = 0
+
+    for line in text.split('\n'):
+        line_start = position
+        position += len(line) + 1
+        line_words.append(len(words))
+        line_chars.append(line_start)
+        raw = line.split()
+        if not raw:
+            # A blank line is a paragraph break, not a wrapped word
+            hyphenated = None
+            continue
+
+        plain = line.isascii()
+        tokens = raw if plain else [normalize(token) for token in raw]
+        first = 0
+        if hyphenated is not None and tokens[0][:1].islower():
+            head = words[hyphenated]
+            words[hyphenated] = (head[:-1] if head.endswith('-') else head) + tokens[0]
+            first = 1
+            line_words[-1] = len(words)
+        joined = hyphenated if first and len(raw) == 1 else None
+
+        if first == 0 and plain:
+            words.extend(tokens)
+            if offsets:
+                for match in WORD.finditer(line):
+                    spans.append(line_start + match.start())
+                    spans.append(line_start + match.end())
+        else:
+            # Tokens made only of zero-width characters normalize to nothing
+            matches = list(WORD.finditer(line)) if offsets else None
+            for i in range(first, len(tokens)):
+                if tokens[i]:
+                    words.append(tokens[i])
+                    if offsets:
+                        spans.append(line_start + matches[i].start())
+                        spans.append(line_start + matches[i].end())
+
+        last = raw[-1]
+        if joined is not None and last[-1] in HYPHENS:
+            # "infor-" "ma-" "tion" over three lines
+            hyphenated = joined
+        elif len(raw) > first and last[-1] in HYPHENS and len(last) > 1 and last[-2].isalpha() and tokens[-1]:
+            hyphenated = len(words) - 1
+        else:
+            hyphenated = None
+
+    line_words.append(len(words))
+    line_chars.append(len(text) + 1)
+    return words, spans, _edge_lines(text, line_words, line_chars)
+
+
+def _edge_lines(text, line_words, line_chars):
+    lines = len(line_words) - 1
+    edges = []
+    for order in (range(lines), range(lines - 1, -1, -1)):
+        found = 0
+        for i in order:
+            if found == EDGE_LINES:
+                break
+            if line_words[i + 1] > line_words[i]:
+                edges.append(i)
+                found += 1
+    result = []
+    for i in sorted(set(edges)):
+        if line_words[i + 1] - line_words[i] <= MAX_EDGE_WORDS:
+            key = ' '.join(text[line_chars[i]:line_chars[i + 1]].split()).lower()
+            result.append((key, line_words[i], line_words[i + 1]))
+    return result
+
+
+class RunningLines:
+    # Running headers and footers across the pages of one document, in page
+    # order. An edge line is dropped when it is only a page number, or when
+    # the same text, digits aside, was at an edge of a recent page. Pages
+    # are streamed, so a header is kept the first time it is seen.
+
+    def __init__(self, window=RUNNING_WINDOW):
+        self.window = window
+        self.last_seen = {}
+
+    def drop(self, page_index, edges):
+        # Word ranges of this page to leave out
+        dropped = []
+        for key, start, end in edges:
+            running = DIGITS.sub('#', key)
+            seen = self.last_seen.get(running)
+            if PAGE_NUMBER.fullmatch(key) or (seen is not None and 0 < page_index - seen <= self.window):
+                dropped.append((start, end))
+            self.last_seen[running] = page_index
+        return dropped
+
+
+def drop_words(words, boxes, ranges):
+    # words and boxes without the given word ranges; boxes may be None
+    kept_words = []
+    kept_boxes = array('f') if boxes is not None else None
+    position = 0
+    for start, end in ranges + [(len(words), len(words))]:
+        kept_words.extend(words[position:start])
+        if boxes is not None:
+            kept_boxes.extend(boxes[position * 4:start * 4])
+        position = end
+    return kept_words, kept_boxes
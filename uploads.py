@@ -0,0 +1,35 @@
+import io
+import mmap
+
+
+class UploadedFile:
+    # The bytes of an uploaded file without copying them into the heap.
+    # Werkzeug spools request files to a temporary file; that file is mapped
+    # read-only and the map outlives the request, so it can also be handed
+    # to a background job after Flask has closed the upload.
+
+    def __init__(self, file_storage):
+        self.filename = file_storage.filename
+        self.mimetype = file_storage.mimetype
+        stream = file_storage.stream
+        stream.seek(0, io.SEEK_END)
+        self.size = stream.tell()
+        stream.seek(0)
+
+        if self.size == 0:
+            self.data = b''
+        else:
+            try:
+                fileno = stream.fileno()
+                stream.flush()
+            except (AttributeError, OSError, io.UnsupportedOperation):
+                fileno = None
+            if fileno is None:
+                # In-memory stream, e.g. from the test client
+                self.data = stream.read()
+            else:
+                self.data = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
@@ -0,0 +1,97 @@
+import json
+import operator
+import struct
+import sys
+from array import array
+from itertools import accumulate, chain
+
+# Binary alternative to the JSON word payload, negotiated with
+# Accept: application/vnd.speedread.words. The browser decodes it with one
+# TextDecoder call and typed-array views (static/wordpack.js).
+#
+# All integers are little-endian and every section starts 4-byte aligned:
+#   header     'SRW2', then uint32 flags, word count, sentence break count,
+#              metadata length and text length
+#   metadata   UTF-8 JSON object (stats, sha256, ...)
+#   breaks     uint32[break count], sentence break indices as the gap from
+#              the previous break (the first from -1)
+#   positions  float32[count * 4], word boxes, only with FLAG_POSITIONS
+#   orp        uint16[count]
+#   dwell      uint8[count]
+#   text       the words joined with newlines, as UTF-8
+#
+# Words never contain whitespace, so the newlines mark word boundaries, and
+# they compress far better under gzip than a table of word offsets or lengths.
+MIMETYPE = 'application/vnd.speedread.words'
+MAGIC = b'SRW2'
+FLAG_POSITIONS = 1
+HEADER = struct.Struct('<4s5I')
+
+
+def encode_words(words, dwell, orp, sentence_breaks=(), positions=None, meta=None):
+    # positions is the raw little-endian Float32 quad buffer, if any
+    text = '\n'.join(words)
+    if text.count('\n') != max(len(words) - 1, 0):
+        raise ValueError('Words cannot contain newlines')
+    breaks = array('I', map(operator.sub, sentence_breaks, chain((-1,), sentence_breaks)))
+    orp_array = array('H', orp)
+    if sys.byteorder == 'big':
+        for section in (breaks, orp_array):
+            section.byteswap()
+
+    meta_bytes = json.dumps(meta or {}, separators=(',', ':')).encode('utf-8')
+    text_bytes = text.encode('utf-8')
+    flags = FLAG_POSITIONS if positions is not None else 0
+
+    parts = [
+        HEADER.pack(MAGIC, flags, len(words), len(breaks), len(meta_bytes), len(text_bytes)),
+        _pad(meta_bytes),
+        breaks.tobytes(),
+    ]
+    if positions is not None:
+        parts.append(positions)
+    parts.append(_pad(orp_array.tobytes()))
+    parts.append(_pad(bytes(dwell)))
+    parts.append(text_bytes)
+    return b''.join(parts)
+
+
+def decode_words(data):
+    # Python counterpart of decodeWordPack, for benchmarks, tests and debugging
+    magic, flags, count, break_count, meta_length, text_length = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError('Not a word pack')
+    offset = HEADER.size
+    meta = json.loads(bytes(data[offset:offset + meta_length]))
+    offset = _align(offset + meta_length)
+
+    def take(typecode, n):
+        nonlocal offset
+        section = array(typecode)
+        section.frombytes(data[offset:offset + n * section.itemsize])
+        if sys.byteorder == 'big':
+            section.byteswap()
+        offset = _align(offset + n * section.itemsize)
+        return section
+
+    gaps = take('I', break_count)
+    positions = take('f', count * 4) if flags & FLAG_POSITIONS else None
+    orp = take('H', count)
+    dwell = take('B', count)
+    text = bytes(data[offset:offset + text_length]).decode('utf-8')
+    return {
+        'meta': meta,
+        'words': text.split('\n') if count else [],
+        'sentenceBreaks': [index - 1 for index in accumulate(gaps)],
+        'positions': positions,
+        'orp': list(orp),
+        'dwell': list(dwell),
+    }
+
+
+def _align(offset):
+    return (offset + 3) & ~3
+
+
+def _pad(section):
+    return section + b'\0' * (_align(len(section)) - len(section))